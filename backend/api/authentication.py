@@ -0,0 +1,26 @@
+from copy import copy
+
+from rest_framework.authentication import TokenAuthentication
+
+from .cache import auth_token_cache, auth_token_user_keys
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену с кэшем токенов в памяти процесса: запрос
+    токена с пользователем выполняется только при промахе кэша. Каждому
+    запросу отдаётся своя копия пользователя, чтобы изменения атрибутов
+    в одном запросе не попадали в другие. Ключ токена запоминается и по
+    идентификатору пользователя, чтобы запись можно было удалить при
+    изменении пользователя.
+    """
+
+    def authenticate_credentials(self, key):
+        token = auth_token_cache.get(key)
+        if token is None:
+            _, token = super().authenticate_credentials(key)
+            auth_token_cache.set(key, token)
+        # Обновляется и при попадании, чтобы индекс не вытеснялся раньше
+        # самой записи.
+        auth_token_user_keys.set(token.user_id, key)
+        return copy(token.user), token
@@ -0,0 +1,457 @@
+"""
+Замеры производительности горячих участков кода. Запускаются командой
+python manage.py benchmark [имя ...].
+"""
+import random
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+from http import HTTPStatus
+from io import StringIO
+from itertools import count
+from tempfile import TemporaryDirectory
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.test.utils import CaptureQueriesContext, override_settings
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from foodgram.constants import PAGINATION_PAGE_SIZE
+from recipes.feed import (
+    FEED_ORDERING,
+    get_fan_out_feed,
+    get_timeline_feed,
+    rebuild_timeline
+)
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.utils import assign_short_link_code
+from users.models import Subscription
+
+from . import shopping_list
+from .search import ingredient_search_index, search_ingredients
+
+User = get_user_model()
+
+BENCHMARKS = {}
+
+
+class BenchmarkDataMissingError(Exception):
+    """В БД нет данных, на которых выполняется замер."""
+
+
+def benchmark(name):
+    """Регистрирует функцию замера под указанным именем."""
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+@contextmanager
+def rollback():
+    """Откатывает все изменения БД, сделанные внутри блока."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+@contextmanager
+def execute_on_commit():
+    """
+    Выполняет при выходе из блока функции transaction.on_commit,
+    зарегистрированные внутри него. Внутри rollback() фиксации нет, и без
+    этого работа после фиксации (версии корзин, кэш токенов) не попадала бы
+    в замер.
+    """
+    start = len(connection.run_on_commit)
+    yield
+    # Функции могут регистрировать новые, поэтому список проверяется до
+    # тех пор, пока он не опустеет.
+    while len(connection.run_on_commit) > start:
+        callbacks = connection.run_on_commit[start:]
+        del connection.run_on_commit[start:]
+        for _, callback, _ in callbacks:
+            callback()
+
+
+def ensure_ingredients():
+    """Загружает ингредиенты из data/ingredients.csv, если их ещё нет."""
+    if not Ingredient.objects.exists():
+        call_command('load_ingredients', stdout=StringIO())
+
+
+def measure(func, repeat):
+    """
+    Вызывает func repeat раз и возвращает статистику по реальному и
+    процессорному времени одного вызова в миллисекундах, а также число
+    запросов к БД и пиковый объём выделенной памяти за один вызов.
+    """
+    wall_times = []
+    cpu_times = []
+    for _ in range(repeat):
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        func()
+        cpu_times.append((time.process_time() - cpu_start) * 1000)
+        wall_times.append((time.perf_counter() - wall_start) * 1000)
+    wall_times.sort()
+    # Запросы и память замеряются отдельным вызовом: tracemalloc заметно
+    # замедляет выполнение и исказил бы время.
+    with CaptureQueriesContext(connection) as queries:
+        tracemalloc.start()
+        try:
+            func()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {
+        'p50_ms': round(statistics.median(wall_times), 3),
+        'p95_ms': round(
+            wall_times[min(len(wall_times) - 1, int(len(wall_times) * 0.95))],
+            3
+        ),
+        'cpu_ms': round(statistics.mean(cpu_times), 3),
+        'queries': len(queries),
+        'peak_memory_kb': round(peak_memory / 1024, 1),
+    }
+
+
+@benchmark('shopping_list_pdf')
+def shopping_list_pdf(repeat, scale):
+    """
+    Сравнивает генерацию PDF с повторной регистрацией шрифта на каждый
+    запрос (прежнее поведение) и с зарегистрированным один раз шрифтом.
+    """
+    items = [
+        {
+            'ingredient__name': f'Ингредиент {index}',
+            'ingredient__measurement_unit': 'г',
+            'total_amount': index,
+        }
+        for index in range(50)
+    ]
+
+    def render_with_font_registration():
+        pdfmetrics.registerFont(
+            TTFont(shopping_list.FONT_NAME, shopping_list.FONT_PATH)
+        )
+        shopping_list.render(items)
+
+    return {
+        'register_font_per_request': measure(
+            render_with_font_registration, repeat
+        ),
+        'cached_font': measure(lambda: shopping_list.render(items), repeat),
+    }
+
+
+@benchmark('ingredient_search')
+def ingredient_search(repeat, scale):
+    """
+    Сравнивает прежний фильтр icontains с поиском по индексу (для
+    автодополнения: короткие запросы по мере ввода).
+    """
+    queries = ('м', 'мо', 'мол', 'моло', 'сах', 'соль', 'ку', 'ра')
+    with rollback():
+        ensure_ingredients()
+        ingredient_search_index.invalidate()
+        ingredient_search_index.get_entries()
+
+        def filter_icontains():
+            for query in queries:
+                list(Ingredient.objects.filter(name__icontains=query))
+
+        def search_index():
+            for query in queries:
+                list(search_ingredients(Ingredient.objects.all(), query))
+
+        return {
+            'icontains': measure(filter_icontains, repeat),
+            'search_index': measure(search_index, repeat),
+        }
+
+
+@benchmark('tags_filter')
+def tags_filter(repeat, scale):
+    """
+    Сравнивает фильтр по тегам через JOIN + DISTINCT и через IN (подзапрос)
+    на сгенерированных данных (при scale=1: 100 000 рецептов и 20 тегов).
+    Замеряется то, что делает постраничная пагинация: COUNT и первая
+    страница.
+    """
+    recipes_count = int(100_000 * scale)
+    generator = random.Random(0)
+    with rollback():
+        author = User.objects.create(
+            username='benchmark_author', email='benchmark_author@example.com'
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {index}', slug=f'benchmark-tag-{index}')
+            for index in range(20)
+        )
+        recipes = Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author=author,
+                    name=f'Рецепт {index}',
+                    image='recipe_images/benchmark.png',
+                    text='Описание',
+                    cooking_time=generator.randint(1, 180)
+                )
+                for index in range(recipes_count)
+            ),
+            batch_size=1000
+        )
+        Recipe.tags.through.objects.bulk_create(
+            (
+                Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+                for recipe in recipes
+                for tag in generator.sample(tags, generator.randint(1, 4))
+            ),
+            batch_size=1000
+        )
+        tag_slugs = [tag.slug for tag in tags[:3]]
+
+        def run_distinct():
+            queryset = Recipe.objects.filter(
+                tags__slug__in=tag_slugs
+            ).distinct()
+            queryset.count()
+            list(queryset[:10])
+
+        def run_in_subquery():
+            queryset = Recipe.objects.filter(
+                id__in=Recipe.tags.through.objects.filter(
+                    tag__slug__in=tag_slugs
+                ).values('recipe_id')
+            )
+            queryset.count()
+            list(queryset[:10])
+
+        return {
+            'join_distinct': measure(run_distinct, repeat),
+            'in_subquery': measure(run_in_subquery, repeat),
+        }
+
+
+@benchmark('feed')
+def feed(repeat, scale):
+    """
+    Сравнивает ленту подписок, собираемую при чтении (IN по авторам из
+    подписок), и материализованную ленту FeedEntry. При scale=1 читатель
+    подписан на 200 из 2000 авторов, у каждого автора 50 рецептов.
+    Замеряются первая страница и страница по курсору из середины ленты.
+    """
+    authors_count = int(2000 * scale)
+    followed_count = max(1, authors_count // 10)
+    recipes_per_author = 50
+    with rollback():
+        reader = User.objects.create(
+            username='benchmark_reader', email='benchmark_reader@example.com'
+        )
+        authors = User.objects.bulk_create(
+            (
+                User(
+                    username=f'benchmark_author_{index}',
+                    email=f'benchmark_author_{index}@example.com'
+                )
+                for index in range(authors_count)
+            ),
+            batch_size=1000
+        )
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author=author,
+                    name=f'Рецепт {author.username} {index}',
+                    image='recipe_images/benchmark.png',
+                    text='Описание',
+                    cooking_time=10
+                )
+                for author in authors
+                for index in range(recipes_per_author)
+            ),
+            batch_size=1000
+        )
+        Subscription.objects.bulk_create(
+            (
+                Subscription(user=reader, author=author)
+                for author in authors[:followed_count]
+            ),
+            batch_size=1000
+        )
+        rebuild_timeline(reader.id)
+        middle = get_fan_out_feed(reader).order_by(*FEED_ORDERING)[
+            followed_count * recipes_per_author // 2
+        ]
+
+        def read_pages(queryset):
+            queryset = queryset.order_by(*FEED_ORDERING)
+            list(queryset[:PAGINATION_PAGE_SIZE])
+            list(
+                queryset.filter(
+                    Q(feed_created_at__lt=middle.created_at)
+                    | Q(
+                        feed_created_at=middle.created_at,
+                        feed_recipe_id__lt=middle.id
+                    )
+                )[:PAGINATION_PAGE_SIZE]
+            )
+
+        return {
+            'fan_out_on_read': measure(
+                lambda: read_pages(get_fan_out_feed(reader)), repeat
+            ),
+            'materialized_timeline': measure(
+                lambda: read_pages(get_timeline_feed(reader)), repeat
+            ),
+        }
+
+
+# Изображение 1×1 PNG для запросов на создание и изменение рецептов.
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1Pe'
+    'AAAADElEQVR4nGP4z8AAAAMBAQDJ/pLvAAAAAElFTkSuQmCC'
+)
+
+
+@benchmark('api')
+def api(repeat, scale):
+    """
+    Замеряет запросы к API через тестовый клиент на данных, уже лежащих в
+    БД (см. команду seed_benchmark_data): списки рецептов с фильтрами,
+    рецепт, создание и изменение рецепта, подписки, поиск ингредиентов,
+    выгрузку списка покупок и переход по короткой ссылке. Изменения БД
+    откатываются, загруженные изображения сохраняются во временный каталог.
+    Функции on_commit выполняются после каждого запроса, как при фиксации.
+    Варианты *_cold выгружают список покупок после увеличения версии
+    корзины (один UPDATE входит в замер), то есть без готового кэша.
+    """
+    reader = User.objects.filter(recipes_count=0).order_by(
+        '-subscriptions_count', '-favorite_recipes_count'
+    ).first()
+    recipe = Recipe.objects.order_by('-favorites_count').first()
+    if reader is None or recipe is None:
+        raise BenchmarkDataMissingError(
+            'нет данных для замера, выполните '
+            'python manage.py seed_benchmark_data'
+        )
+    author = User.objects.order_by('-recipes_count').first()
+    tag_slugs = list(Tag.objects.values_list('slug', flat=True)[:2])
+    host = next(
+        (host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'),
+        'localhost'
+    )
+    names = (f'Рецепт для замера {index}' for index in count())
+    with rollback(), TemporaryDirectory() as media_root, override_settings(
+        MEDIA_ROOT=media_root
+    ):
+        token, _ = Token.objects.get_or_create(user=reader)
+        guest_client = APIClient(SERVER_NAME=host)
+        client = APIClient(SERVER_NAME=host)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        recipe_data = {
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 100}
+                for ingredient_id in Ingredient.objects.values_list(
+                    'id', flat=True
+                )[:10]
+            ],
+            'tags': list(Tag.objects.values_list('id', flat=True)[:2]),
+            'image': IMAGE,
+            'text': 'Описание',
+            'cooking_time': 30,
+        }
+        own_recipe_id = client.post(
+            '/api/recipes/',
+            {**recipe_data, 'name': next(names)},
+            format='json'
+        ).data['id']
+        code = assign_short_link_code(recipe)
+        shopping_list_url = '/api/recipes/download_shopping_cart/'
+
+        def get(client, url, data=None):
+            return lambda: client.get(url, data)
+
+        def download_shopping_list(data=None):
+            return b''.join(
+                client.get(shopping_list_url, data).streaming_content
+            )
+
+        def cold(request):
+            def run():
+                User.objects.filter(id=reader.id).update(
+                    shopping_cart_version=F('shopping_cart_version') + 1
+                )
+                return request()
+            return run
+
+        def committed(request):
+            def run():
+                with execute_on_commit():
+                    return request()
+            return run
+
+        requests = {
+            'recipe_list_anonymous': get(guest_client, '/api/recipes/'),
+            'recipe_list': get(client, '/api/recipes/'),
+            'recipe_list_tags': get(
+                client, '/api/recipes/', {'tags': tag_slugs}
+            ),
+            'recipe_list_author': get(
+                client, '/api/recipes/', {'author': author.id}
+            ),
+            'recipe_list_favorited': get(
+                client, '/api/recipes/', {'is_favorited': 1}
+            ),
+            'recipe_list_in_shopping_cart': get(
+                client, '/api/recipes/', {'is_in_shopping_cart': 1}
+            ),
+            'recipe_detail': get(client, f'/api/recipes/{recipe.id}/'),
+            'recipe_create': lambda: client.post(
+                '/api/recipes/',
+                {**recipe_data, 'name': next(names)},
+                format='json'
+            ),
+            'recipe_patch': lambda: client.patch(
+                f'/api/recipes/{own_recipe_id}/',
+                {**recipe_data, 'name': next(names)},
+                format='json'
+            ),
+            'feed': get(client, '/api/recipes/feed/'),
+            'subscriptions': get(
+                client, '/api/users/subscriptions/', {'recipes_limit': 3}
+            ),
+            'ingredient_search': get(
+                guest_client, '/api/ingredients/', {'name': 'мол'}
+            ),
+            'shopping_list_pdf': download_shopping_list,
+            'shopping_list_csv': lambda: download_shopping_list(
+                {'format': 'csv'}
+            ),
+            'shopping_list_pdf_cold': cold(download_shopping_list),
+            'shopping_list_csv_cold': cold(
+                lambda: download_shopping_list({'format': 'csv'})
+            ),
+            'short_link_redirect': get(guest_client, f'/s/{code}/'),
+        }
+        requests = {
+            name: committed(request) for name, request in requests.items()
+        }
+        for name, request in requests.items():
+            response = request()
+            status_code = getattr(response, 'status_code', HTTPStatus.OK)
+            if status_code >= HTTPStatus.BAD_REQUEST:
+                raise CommandError(f'{name}: ответ {status_code}')
+        return {
+            name: measure(request, repeat)
+            for name, request in requests.items()
+        }
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+
+from foodgram.constants import (
+    AUTH_TOKEN_CACHE_MAX_SIZE,
+    AUTH_TOKEN_CACHE_TIMEOUT,
+    REFERENCE_DATA_CACHE_MAX_SIZE,
+    REFERENCE_DATA_CACHE_TIMEOUT,
+    SHORT_LINK_CACHE_MAX_SIZE,
+    SHORT_LINK_CACHE_TIMEOUT
+)
+
+registered_caches = {}
+
+
+class LRUCache:
+    """
+    Ограниченный по размеру кэш процесса с вытеснением давно не
+    использованных записей и временем жизни записей. Считает попадания и
+    промахи для мониторинга.
+    """
+
+    def __init__(self, name, max_size, timeout=None):
+        self.name = name
+        self.max_size = max_size
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        registered_caches[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (
+                entry[1] is None or entry[1] > time.monotonic()
+            ):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):  # noqa: A003
+        expires_at = (
+            time.monotonic() + self.timeout if self.timeout else None
+        )
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+# Код короткой ссылки -> адрес перенаправления. Время жизни ограничивает
+# устаревание записей в других процессах после удаления рецепта.
+short_link_cache = LRUCache(
+    'short_links',
+    max_size=SHORT_LINK_CACHE_MAX_SIZE,
+    timeout=SHORT_LINK_CACHE_TIMEOUT
+)
+
+# Сериализованные ответы справочников; ключ содержит версию справочников.
+reference_data_cache = LRUCache(
+    'reference_data',
+    max_size=REFERENCE_DATA_CACHE_MAX_SIZE,
+    timeout=REFERENCE_DATA_CACHE_TIMEOUT
+)
+
+# Ключ токена -> токен с пользователем. Записи удаляются при удалении токена
+# и изменении пользователя (в том числе его счётчиков) в этом процессе;
+# короткое время жизни ограничивает устаревание записей в других процессах.
+auth_token_cache = LRUCache(
+    'auth_tokens',
+    max_size=AUTH_TOKEN_CACHE_MAX_SIZE,
+    timeout=AUTH_TOKEN_CACHE_TIMEOUT
+)
+
+# Идентификатор пользователя -> ключ его токена в auth_token_cache.
+auth_token_user_keys = LRUCache(
+    'auth_token_user_keys',
+    max_size=AUTH_TOKEN_CACHE_MAX_SIZE,
+    timeout=AUTH_TOKEN_CACHE_TIMEOUT
+)
+
+
+def delete_user_auth_tokens(user_ids):
+    """Удаляет из кэша токены пользователей с указанными идентификаторами."""
+    for user_id in user_ids:
+        key = auth_token_user_keys.get(user_id)
+        if key is not None:
+            auth_token_cache.delete(key)
+            auth_token_user_keys.delete(user_id)
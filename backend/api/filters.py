@@ -1,14 +1,22 @@
 from django_filters import rest_framework as filters
+from rest_framework.filters import BaseFilterBackend
 
-from recipes.models import Ingredient, Recipe
+from recipes.models import Recipe
 
+from .search import search_ingredients
 
-class IngredientFilter(filters.FilterSet):
-    name = filters.CharFilter(lookup_expr='icontains')
 
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+class IngredientSearchFilter(BaseFilterBackend):
+    """
+    Поиск ингредиентов по параметру name для автодополнения. Применяется
+    только к списку, так как может вернуть готовый список объектов.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get('name')
+        if query and view.action == 'list':
+            return search_ingredients(queryset, query)
+        return queryset
 
 
 class RecipeFilter(filters.FilterSet):
@@ -45,5 +53,11 @@ class RecipeFilter(filters.FilterSet):
     def tags_filter(self, queryset, name, value):
         tag_slugs = self.request.query_params.getlist('tags')
         if tag_slugs:
-            return queryset.filter(tags__slug__in=tag_slugs).distinct()
+            # Полусоединение через IN (подзапрос) не размножает строки
+            # рецептов, поэтому не нужен DISTINCT по широким строкам.
+            return queryset.filter(
+                id__in=Recipe.tags.through.objects.filter(
+                    tag__slug__in=tag_slugs
+                ).values('recipe_id')
+            )
         return queryset
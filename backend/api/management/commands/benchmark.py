@@ -0,0 +1,86 @@
+import json
+import logging
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from api.benchmarks import BENCHMARKS, BenchmarkDataMissingError
+
+
+class Command(BaseCommand):
+    help = (  # noqa: A003
+        'Выполняет замеры производительности и выводит их результаты.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names',
+            nargs='*',
+            help=(
+                'Имена замеров (по умолчанию выполняются все): '
+                + ', '.join(sorted(BENCHMARKS))
+            )
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Количество повторов каждого варианта.'
+        )
+        parser.add_argument(
+            '--scale',
+            type=float,
+            default=1.0,
+            help='Множитель объёма генерируемых данных.'
+        )
+        parser.add_argument(
+            '--json',
+            type=Path,
+            help='Записать результаты в JSON-файл для сравнения между '
+                 'коммитами.'
+        )
+
+    def handle(self, *args, **options):
+        unknown_names = set(options['names']) - set(BENCHMARKS)
+        if unknown_names:
+            raise CommandError(
+                'Неизвестные замеры: ' + ', '.join(sorted(unknown_names))
+            )
+        # Журналирование SQL в режиме DEBUG искажает замеры.
+        logging.getLogger('django.db.backends').setLevel(logging.WARNING)
+        results = {}
+        for name in options['names'] or BENCHMARKS:
+            try:
+                results[name] = BENCHMARKS[name](
+                    repeat=options['repeat'], scale=options['scale']
+                )
+            except BenchmarkDataMissingError as error:
+                # Остальные замеры создают данные сами и выполняются.
+                self.stderr.write(
+                    self.style.WARNING(f'{name}: пропущен, {error}.')
+                )
+                continue
+            for variant, stats in results[name].items():
+                self.stdout.write(
+                    f'{name} [{variant}]: '
+                    + ', '.join(
+                        f'{key}={value}' for key, value in stats.items()
+                    )
+                )
+        if options['json']:
+            options['json'].write_text(
+                json.dumps(
+                    {
+                        'created_at': timezone.now().isoformat(),
+                        'database': connection.vendor,
+                        'repeat': options['repeat'],
+                        'scale': options['scale'],
+                        'results': results,
+                    },
+                    ensure_ascii=False,
+                    indent=2
+                ),
+                encoding='utf-8'
+            )
@@ -0,0 +1,110 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from api import shopping_list
+from foodgram.constants import (
+    SHOPPING_LIST_JOB_RETENTION,
+    SHOPPING_LIST_JOB_TIMEOUT
+)
+from recipes.models import ShoppingListJob
+
+logger = logging.getLogger(__name__)
+
+
+def claim_job():
+    """
+    Забирает из очереди самое старое задание. Строка блокируется с
+    SKIP LOCKED, поэтому несколько обработчиков не возьмут одно задание.
+    Задания, которые обрабатываются дольше SHOPPING_LIST_JOB_TIMEOUT
+    (обработчик завершился аварийно), забираются повторно.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        job = ShoppingListJob.objects.select_for_update(
+            skip_locked=True
+        ).filter(
+            Q(status=ShoppingListJob.Status.PENDING)
+            | Q(
+                status=ShoppingListJob.Status.PROCESSING,
+                started_at__lt=now - timedelta(
+                    seconds=SHOPPING_LIST_JOB_TIMEOUT
+                )
+            )
+        ).select_related('user').order_by('created_at').first()
+        if job is None:
+            return None
+        job.status = ShoppingListJob.Status.PROCESSING
+        job.started_at = now
+        job.save(update_fields=('status', 'started_at'))
+    return job
+
+
+def process_job(job):
+    try:
+        # Документ формируется по данным БД: кэш списков покупок у
+        # обработчика свой и не видит изменений из веб-процессов.
+        document = shopping_list.render(
+            shopping_list.get_shopping_list(job.user)
+        )
+        job.file.save(
+            f'shopping_cart_{job.id}.pdf', ContentFile(document), save=False
+        )
+        job.status = ShoppingListJob.Status.DONE
+    except Exception:
+        logger.exception('Не удалось сформировать список покупок %s', job.id)
+        job.status = ShoppingListJob.Status.FAILED
+    job.finished_at = timezone.now()
+    job.save(update_fields=('file', 'status', 'finished_at'))
+
+
+def delete_expired_jobs():
+    """
+    Удаляет задания, завершённые раньше SHOPPING_LIST_JOB_RETENTION,
+    вместе с файлами (см. recipes.signals). Возвращает число заданий.
+    """
+    deleted, _ = ShoppingListJob.objects.filter(
+        finished_at__lt=timezone.now() - timedelta(
+            seconds=SHOPPING_LIST_JOB_RETENTION
+        )
+    ).delete()
+    return deleted
+
+
+class Command(BaseCommand):
+    help = (  # noqa: A003
+        'Обрабатывает очередь заданий на формирование списков покупок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать накопившиеся задания и завершиться.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Пауза между опросами пустой очереди в секундах.'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_job()
+            if job is not None:
+                process_job(job)
+                self.stdout.write(f'Задание {job.id}: {job.status}')
+                continue
+            deleted = delete_expired_jobs()
+            if deleted:
+                self.stdout.write(f'Удалено устаревших заданий: {deleted}')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,90 @@
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('api.queries')
+
+# Длина SQL самого частого повторяющегося запроса в журнале.
+REPEATED_SQL_MAX_LENGTH = 200
+
+
+class QueryStats:
+    """
+    Обёртка выполнения запросов (connection.execute_wrapper): считает
+    запросы, суммарное время в БД и повторы одинакового SQL.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    @property
+    def repeated(self):
+        """Число лишних выполнений одинакового SQL (признак N+1)."""
+        return sum(
+            count - 1 for count in self.statements.values() if count > 1
+        )
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Для доли запросов QUERY_INSTRUMENTATION_SAMPLE_RATE считает запросы к
+    БД и время в ней, добавляет заголовок Server-Timing и пишет строку в
+    журнал api.queries. Запросы, выполняемые при чтении потокового ответа,
+    не учитываются: они происходят после выхода из middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.QUERY_INSTRUMENTATION_SAMPLE_RATE:
+            return self.get_response(request)
+        stats = QueryStats()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - start) * 1000
+        db_ms = stats.duration * 1000
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{stats.count} queries, '
+            f'{stats.repeated} repeated", total;dur={total_ms:.1f}'
+        )
+        log_data = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats.count,
+            'repeated_queries': stats.repeated,
+            'db_ms': round(db_ms, 1),
+            'total_ms': round(total_ms, 1),
+        }
+        level = logging.INFO
+        if stats.repeated >= settings.QUERY_INSTRUMENTATION_REPEATED_THRESHOLD:
+            level = logging.WARNING
+            sql, count = stats.statements.most_common(1)[0]
+            log_data['most_repeated_sql'] = sql[:REPEATED_SQL_MAX_LENGTH]
+            log_data['most_repeated_count'] = count
+        logger.log(
+            level,
+            ' '.join(f'{key}={value}' for key, value in log_data.items()),
+            extra={'query_stats': log_data}
+        )
+        return response
@@ -0,0 +1,21 @@
+from rest_framework.exceptions import NotFound
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class FormatParamContentNegotiation(DefaultContentNegotiation):
+    """
+    Выбирает рендерер только по параметру ?format= (или суффиксу формата),
+    не учитывая заголовок Accept. Без параметра выбирается первый рендерер.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        file_format = (
+            format_suffix
+            or request.query_params.get(self.settings.URL_FORMAT_OVERRIDE)
+        )
+        if not file_format:
+            return renderers[0], renderers[0].media_type
+        for renderer in renderers:
+            if renderer.format == file_format:
+                return renderer, renderer.media_type
+        raise NotFound(f'Формат {file_format} не поддерживается.')
@@ -1,8 +1,165 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination,
+    CursorPagination,
+    PageNumberPagination,
+    _reverse_ordering
+)
 
 from foodgram.constants import PAGINATION_PAGE_SIZE
+from recipes.feed import FEED_ORDERING
 
 
 class PageNumberPagination(PageNumberPagination):
     page_size = PAGINATION_PAGE_SIZE
     page_size_query_param = 'limit'
+
+
+class BaseCursorPagination(CursorPagination):
+    page_size = PAGINATION_PAGE_SIZE
+    page_size_query_param = 'limit'
+
+    def decode_cursor(self, request):
+        # Пустой параметр (?cursor=) означает запрос первой страницы.
+        if not request.query_params.get(self.cursor_query_param):
+            return None
+        return super().decode_cursor(request)
+
+
+class KeysetCursorPagination(BaseCursorPagination):
+    """
+    Курсорная пагинация по всем полям ordering. CursorPagination из DRF
+    запоминает только первое поле и при совпадении его значений переходит к
+    OFFSET; здесь позиция содержит значения всех полей, и следующая страница
+    выбирается условием вида a < x OR (a = x AND b < y). Последнее поле
+    ordering должно быть уникальным, поэтому смещение всегда нулевое.
+    Поля ordering могут быть аннотациями запроса.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            _, reverse, current_position = self.cursor
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self.get_position_filter(
+                queryset, current_position, reverse
+            ))
+        # Лишний объект показывает, есть ли следующая страница.
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = (
+            self._get_position_from_instance(results[-1], self.ordering)
+            if len(results) > len(self.page) else None
+        )
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None
+            self.next_position = following_position
+            self.previous_position = current_position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    @staticmethod
+    def get_ordering_field(queryset, name):
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        return queryset.model._meta.get_field(name)
+
+    def get_position_filter(self, queryset, position, reverse):
+        try:
+            values = json.loads(position)
+            if (
+                not isinstance(values, list)
+                or len(values) != len(self.ordering)
+            ):
+                raise ValueError
+            values = [
+                self.get_ordering_field(
+                    queryset, order.lstrip('-')
+                ).to_python(value)
+                for order, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        condition = Q()
+        equal = Q()
+        for order, value in zip(self.ordering, values):
+            field_name = order.lstrip('-')
+            lookup = 'lt' if reverse != order.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{field_name}__{lookup}': value})
+            equal &= Q(**{field_name: value})
+        return condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        return json.dumps([
+            str(
+                instance[order.lstrip('-')] if isinstance(instance, dict)
+                else getattr(instance, order.lstrip('-'))
+            )
+            for order in ordering
+        ])
+
+
+class RecipeCursorPagination(KeysetCursorPagination):
+    ordering = ('-created_at', '-id')
+
+
+class FeedCursorPagination(KeysetCursorPagination):
+    ordering = FEED_ORDERING
+
+
+class AuthorCursorPagination(BaseCursorPagination):
+    # Логин уникален, поэтому порядок совпадает с постраничным режимом.
+    ordering = ('username',)
+
+
+class OptionalCursorPagination(BasePagination):
+    """
+    Постраничная пагинация (page/limit) по умолчанию и курсорная, если в
+    запросе передан параметр cursor. Курсорный режим не выполняет COUNT(*)
+    и OFFSET, поэтому глубокие страницы отдаются так же быстро, как первая.
+    """
+    page_number_pagination_class = PageNumberPagination
+    cursor_pagination_class = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor_query_param = self.cursor_pagination_class.cursor_query_param
+        if cursor_query_param in request.query_params:
+            self.paginator = self.cursor_pagination_class()
+        else:
+            self.paginator = self.page_number_pagination_class()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+
+class RecipePagination(OptionalCursorPagination):
+    cursor_pagination_class = RecipeCursorPagination
+
+
+class AuthorPagination(OptionalCursorPagination):
+    cursor_pagination_class = AuthorCursorPagination
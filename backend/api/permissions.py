@@ -11,5 +11,6 @@ class IsAuthorOrReadOnly(BasePermission):
     def has_object_permission(self, request, view, obj):
         return (
             request.method in SAFE_METHODS
-            or obj.author == request.user
+            # Сравниваются идентификаторы, чтобы не загружать автора.
+            or obj.author_id == request.user.id
         )
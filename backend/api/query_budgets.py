@@ -0,0 +1,87 @@
+"""
+Бюджеты запросов к БД: максимальное число запросов на один вызов каждого
+действия вьюсетов API. Тест QueryBudgetTestCase выполняет каждое действие
+на двух объёмах данных и проверяет, что число запросов не растёт вместе с
+данными и не превышает бюджет. Бюджет — целевое число запросов, из
+которых складывается действие (для тяжёлых действий они перечислены в
+комментариях): превышение означает лишний запрос, а не повод поднять
+бюджет. Точки сохранения тоже считаются: в тесте каждый atomic() даёт
+SAVEPOINT и RELEASE SAVEPOINT. Запросы функций on_commit (например,
+увеличение версий корзин) входят в бюджет действия.
+"""
+from users.views import UserViewSet
+
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+QUERY_BUDGETS = {
+    RecipeViewSet: {
+        'list': 5,
+        'retrieve': 4,
+        # Токен, ингредиенты и теги (по запросу IN), проверка уникальности
+        # названия, рецепт, счётчик автора, подписчики с лентами,
+        # ингредиенты, теги, ответ: ингредиенты и теги; atomic() — 2.
+        'create': 13,
+        # Токен, рецепт, ингредиенты и теги, проверка названия, рецепт,
+        # текущие ингредиенты, изменённые количества, текущие теги, ответ:
+        # ингредиенты и теги; atomic() — 2; после фиксации — версии корзин.
+        'partial_update': 14,
+        # Токен, рецепт, связи с сигналами (ингредиенты, корзины,
+        # избранное), счётчики избранного пользователей, пользователи
+        # корзин и избранного для версий и кэша токенов, удаление тегов,
+        # ленты, ингредиентов, корзин, избранного и рецепта, счётчик
+        # автора; после фиксации — версии корзин. Число запросов не зависит
+        # от числа связей.
+        'destroy': 16,
+        # Токен, флаг ленты, страница, теги и ингредиенты.
+        'feed': 5,
+        # Токен, рецепт, код из пула, запись кода в рецепт, удаление кода
+        # из пула; atomic() — 4.
+        'get_short_link': 9,
+        # Включая версию корзины после фиксации.
+        'add_to_cart': 8,
+        'remove_from_cart': 7,
+        'add_to_favorite': 8,
+        'remove_from_favorite': 7,
+        'download_shopping_cart': 3,
+        'create_shopping_cart_job': 2,
+        'get_shopping_cart_job': 2,
+    },
+    UserViewSet: {
+        'list': 3,
+        'retrieve': 2,
+        'create': 5,
+        'me': 2,
+        'set_password': 2,
+        'update_avatar': 2,
+        'delete_avatar': 1,
+        'add_subscription': 10,
+        'remove_subscription': 8,
+        'get_subscriptions': 4,
+    },
+    # Справочники: чтение версии справочников и сами данные.
+    TagViewSet: {
+        'list': 2,
+        'retrieve': 2,
+    },
+    IngredientViewSet: {
+        'list': 2,
+        'retrieve': 2,
+    },
+}
+
+# Действия djoser, которые клиент Foodgram не использует; бюджет для них не
+# задаётся.
+UNBUDGETED_ACTIONS = {
+    UserViewSet: {
+        'update',
+        'partial_update',
+        'destroy',
+        'activation',
+        'resend_activation',
+        'reset_password',
+        'reset_password_confirm',
+        'set_username',
+        'reset_username',
+        'reset_username_confirm',
+    },
+}
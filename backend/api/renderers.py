@@ -0,0 +1,25 @@
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Рендерер формата списка покупок. Сам документ отдаётся готовым
+    HttpResponse, поэтому рендерер используется только для выбора формата
+    по параметру format; ответы с ошибками отдаются в JSON.
+    """
+
+
+class PDFRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'  # noqa: A003
+    charset = None
+
+
+class PlainTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'  # noqa: A003
+
+
+class CSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'  # noqa: A003
@@ -0,0 +1,92 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+
+from foodgram.constants import (
+    INGREDIENT_SEARCH_INDEX_TIMEOUT,
+    INGREDIENT_SEARCH_RESULTS_LIMIT
+)
+from recipes.models import Ingredient
+
+
+class IngredientSearchIndex:
+    """
+    Отсортированный индекс названий ингредиентов в памяти процесса.
+    Совпадения по началу названия находятся двоичным поиском, совпадения
+    внутри названия — проходом по списку без обращения к БД.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._names = None
+        self._ingredients = None
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._names = None
+
+    def get_entries(self):
+        with self._lock:
+            if self._names is None or (
+                time.monotonic() - self._built_at > self.timeout
+            ):
+                ingredients = sorted(
+                    Ingredient.objects.all(),
+                    key=lambda ingredient: ingredient.name.lower()
+                )
+                self._names = [
+                    ingredient.name.lower() for ingredient in ingredients
+                ]
+                self._ingredients = ingredients
+                self._built_at = time.monotonic()
+            return self._names, self._ingredients
+
+    def search(self, query, limit):
+        """Возвращает ингредиенты: сначала совпавшие по началу названия."""
+        names, ingredients = self.get_entries()
+        query = query.lower()
+        result = []
+        index = bisect_left(names, query)
+        while (
+            index < len(names)
+            and names[index].startswith(query)
+            and len(result) < limit
+        ):
+            result.append(ingredients[index])
+            index += 1
+        for name, ingredient in zip(names, ingredients):
+            if len(result) == limit:
+                break
+            if query in name and not name.startswith(query):
+                result.append(ingredient)
+        return result
+
+
+ingredient_search_index = IngredientSearchIndex(
+    INGREDIENT_SEARCH_INDEX_TIMEOUT
+)
+
+
+def search_ingredients(
+    queryset, query, limit=INGREDIENT_SEARCH_RESULTS_LIMIT
+):
+    """
+    Ищет ингредиенты по вхождению строки в название. Совпадения по началу
+    названия идут первыми, количество результатов ограничено. В PostgreSQL
+    поиск выполняется по триграммному индексу, в остальных БД — по индексу
+    в памяти процесса (тогда возвращается список объектов, а не запрос).
+    """
+    if connection.vendor == 'postgresql':
+        return queryset.filter(name__icontains=query).annotate(
+            rank=Case(
+                When(name__istartswith=query, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField()
+            )
+        ).order_by('rank', 'name')[:limit]
+    return ingredient_search_index.search(query, limit)
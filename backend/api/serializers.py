@@ -1,3 +1,7 @@
+from collections.abc import Mapping
+
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.serializers import ValidationError
@@ -8,8 +12,10 @@ from recipes.models import (
     Recipe,
     RecipeIngredient,
     ShoppingCart,
+    ShoppingListJob,
     Tag
 )
+from recipes.utils import bump_shopping_cart_versions
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -24,8 +30,46 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+def prepare_pks(model, values):
+    """Приводит значения к типу первичного ключа, пропуская некорректные."""
+    pks = []
+    for value in values:
+        if isinstance(value, bool):
+            continue
+        try:
+            pks.append(model._meta.pk.get_prep_value(value))
+        except (TypeError, ValueError):
+            continue
+    return pks
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Поле первичного ключа, которое берёт объекты из загруженных одним
+    запросом в корневом сериализаторе (атрибут resolved_objects), а не
+    выполняет запрос для каждого значения. Ошибки совпадают с
+    PrimaryKeyRelatedField.
+    """
+
+    def to_internal_value(self, data):
+        model = self.get_queryset().model
+        resolved_objects = getattr(self.root, 'resolved_objects', {})
+        if model not in resolved_objects:
+            return super().to_internal_value(data)
+        try:
+            if isinstance(data, bool):
+                raise TypeError
+            pk = model._meta.pk.get_prep_value(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return resolved_objects[model][pk]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
+
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(  # noqa: A003
+    id = BulkPrimaryKeyRelatedField(  # noqa: A003
         # Устанавливается queryset чтобы не возникала ошибка: "Relational field
         # must provide a `queryset` argument, override `get_queryset`, or set
         # read_only=`True`."
@@ -57,16 +101,27 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        exclude = ('short_link_code', 'created_at')
+        exclude = (
+            'short_link_code',
+            'created_at',
+            'favorites_count',
+            'shopping_carts_count'
+        )
 
     def get_author(self, obj):
         from users.serializers import UserSerializer
+        if hasattr(obj, 'is_author_subscribed'):
+            obj.author.is_subscribed = obj.is_author_subscribed
         return UserSerializer(
             obj.author,
             context=self.context
         ).data
 
+    # Значения берутся из аннотаций RecipeViewSet.get_queryset, а запрос к БД
+    # выполняется только для объектов без них (например, после создания).
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         return (
             user.is_authenticated
@@ -74,6 +129,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         return (
             user.is_authenticated
@@ -86,7 +143,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         many=True,
         source='recipe_ingredients'
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
         many=True
     )
@@ -97,9 +154,32 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         model = Recipe
         exclude = (
             'short_link_code',
-            'created_at'
+            'created_at',
+            'favorites_count',
+            'shopping_carts_count'
         )
 
+    def to_internal_value(self, data):
+        # Все указанные ингредиенты и теги загружаются двумя запросами IN,
+        # а поля первичных ключей берут объекты из resolved_objects.
+        if not isinstance(data, Mapping):
+            return super().to_internal_value(data)
+        ingredients = data.get('ingredients')
+        tags = data.get('tags')
+        self.resolved_objects = {
+            Ingredient: Ingredient.objects.in_bulk(prepare_pks(
+                Ingredient,
+                [
+                    ingredient.get('id') for ingredient in ingredients
+                    if isinstance(ingredient, dict)
+                ] if isinstance(ingredients, list) else []
+            )),
+            Tag: Tag.objects.in_bulk(prepare_pks(
+                Tag, tags if isinstance(tags, list) else []
+            )),
+        }
+        return super().to_internal_value(data)
+
     def validate(self, data):
         errors = {}
         # Ингредиенты.
@@ -137,30 +217,102 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         return self.save_recipe(validated_data, instance)
 
+    @transaction.atomic
     def save_recipe(self, validated_data, instance=None):
         """Универсальная функция для создания и обновления."""
         ingredients = validated_data.pop('recipe_ingredients')
         tags = validated_data.pop('tags')
         # Создание или обновление рецепта (пока без ингредиентов и тегов).
-        recipe, _ = Recipe.objects.update_or_create(
-            id=instance.id if instance else None,
-            defaults=validated_data
-        )
-        # Создание или обновление ингредиентов.
-        recipe.recipe_ingredients.all().delete()
-        RecipeIngredient.objects.bulk_create([
+        # Изменяемый рецепт уже загружен вьюсетом, поэтому сохраняются
+        # только переданные поля, без повторной выборки.
+        if instance:
+            recipe = instance
+            for field, value in validated_data.items():
+                setattr(recipe, field, value)
+            recipe.save(update_fields=validated_data)
+        else:
+            recipe = Recipe.objects.create(**validated_data)
+            # Новый рецепт ещё не в избранном и не в корзине.
+            recipe.is_favorited = recipe.is_in_shopping_cart = False
+        # Рецепт сохраняет его автор (IsAuthorOrReadOnly): он уже загружен
+        # аутентификацией, а подписаться на себя нельзя.
+        recipe.author = self.context['request'].user
+        recipe.is_author_subscribed = False
+        # Создание или обновление ингредиентов: изменяются только строки,
+        # которые отличаются от текущих.
+        amounts = {
+            ingredient['ingredient'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        current_ingredients = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe
+            )
+        } if instance else {}
+        ingredients_to_delete = [
+            recipe_ingredient.id
+            for ingredient_id, recipe_ingredient in current_ingredients.items()
+            if ingredient_id not in amounts
+        ]
+        ingredients_to_update = []
+        for ingredient_id, recipe_ingredient in current_ingredients.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != recipe_ingredient.amount:
+                recipe_ingredient.amount = amount
+                ingredients_to_update.append(recipe_ingredient)
+        ingredients_to_create = [
             RecipeIngredient(
-                recipe=recipe,
-                ingredient=ingredient['ingredient'],
-                amount=ingredient['amount']
-            ) for ingredient in ingredients
-        ])
-        # Создание или обновление тегов.
-        recipe.tags.set(tags)
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current_ingredients
+        ]
+        if ingredients_to_delete:
+            # Одним DELETE без сигналов строк: сигнал сбросил бы версии
+            # корзин отдельным запросом на каждую удалённую строку.
+            RecipeIngredient.objects.filter(
+                id__in=ingredients_to_delete
+            )._raw_delete(RecipeIngredient.objects.db)
+        if ingredients_to_update:
+            RecipeIngredient.objects.bulk_update(
+                ingredients_to_update, ('amount',)
+            )
+        if ingredients_to_create:
+            RecipeIngredient.objects.bulk_create(ingredients_to_create)
+        # Создание или обновление тегов (set() сам удаляет и добавляет только
+        # изменившиеся связи, у нового рецепта связей нет).
+        if instance:
+            recipe.tags.set(tags)
+        else:
+            recipe.tags.add(*tags)
+        # Состав ингредиентов изменился, поэтому кэш списков покупок с этим
+        # рецептом становится недействительным. Версии сбрасываются одним
+        # запросом на всё изменение: сигналы строк рецепта при массовых
+        # операциях этого не делают.
+        if instance and (
+            ingredients_to_delete
+            or ingredients_to_update
+            or ingredients_to_create
+        ):
+            bump_shopping_cart_versions(
+                recipe.shoppingcart_users.values('user')
+            )
         #
         return recipe
 
     def to_representation(self, data):
+        # Ингредиенты загружаются одним запросом вместе с продуктами, а не
+        # по запросу на каждый ингредиент рецепта.
+        prefetch_related_objects(
+            (data,),
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ).order_by('ingredient__name')
+            )
+        )
         return (
             RecipeReadSerializer(
                 context=self.context
@@ -201,3 +353,10 @@ class FavoriteSerializer(BaseUserRecipeSerializer):
 
     class Meta(BaseUserRecipeSerializer.Meta):
         model = Favorite
+
+
+class ShoppingListJobSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ShoppingListJob
+        fields = ('id', 'status', 'created_at', 'finished_at')
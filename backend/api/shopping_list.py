@@ -0,0 +1,167 @@
+import csv
+import json
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from reportlab.lib import enums, pagesizes, styles
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import (
+    ListFlowable,
+    ListItem,
+    Paragraph,
+    SimpleDocTemplate
+)
+
+from foodgram.constants import SHOPPING_LIST_CACHE_TIMEOUT
+from recipes.models import RecipeIngredient
+from recipes.utils import get_shopping_cart_version
+
+FONT_NAME = 'OpenSans'
+FONT_PATH = settings.BASE_DIR / 'fonts/OpenSans-Regular.ttf'
+
+# Стили создаются один раз на процесс и переиспользуются всеми запросами.
+HEADER_STYLE = styles.ParagraphStyle(
+    'HeaderStyle',
+    fontName=FONT_NAME,
+    fontSize=14,
+    alignment=enums.TA_CENTER,
+    spaceAfter=25
+)
+REGULAR_STYLE = styles.ParagraphStyle(
+    'RegularStyle',
+    fontName=FONT_NAME,
+    fontSize=12,
+    spaceAfter=10
+)
+
+
+def get_shopping_list(user):
+    """Суммирует ингредиенты всех рецептов из корзины пользователя."""
+    return (
+        RecipeIngredient.objects.filter(
+            recipe__shoppingcart_users__user=user
+        ).values(
+            'ingredient__name', 'ingredient__measurement_unit'
+        ).annotate(
+            total_amount=Sum('amount')
+        ).order_by(
+            'ingredient__name'
+        )
+    )
+
+
+def register_font():
+    """
+    Регистрирует шрифт в ReportLab. Файл шрифта разбирается только при
+    первом вызове в процессе.
+    """
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+def format_item(item):
+    return (
+        f'{item["ingredient__name"]} — {item["total_amount"]} '
+        f'{item["ingredient__measurement_unit"]}'
+    )
+
+
+def render(items):
+    """Формирует PDF со списком покупок и возвращает его содержимое."""
+    register_font()
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=pagesizes.letter)
+    # Формирование заголовка и списка ингредиентов с буллетами.
+    header = Paragraph('Список покупок', HEADER_STYLE)
+    bullet_points = ListFlowable(
+        [
+            ListItem(Paragraph(format_item(item), REGULAR_STYLE))
+            for item in items
+        ],
+        bulletType='bullet'
+    )
+    doc.build([header, bullet_points])
+    return buffer.getvalue()
+
+
+class EchoBuffer:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def stream_txt(items):
+    yield 'Список покупок\n\n'
+    for item in items:
+        yield f'• {format_item(item)}\n'
+
+
+def stream_csv(items):
+    writer = csv.writer(EchoBuffer())
+    yield writer.writerow(('Ингредиент', 'Количество', 'Единица измерения'))
+    for item in items:
+        yield writer.writerow((
+            item['ingredient__name'],
+            item['total_amount'],
+            item['ingredient__measurement_unit']
+        ))
+
+
+def stream_json(items):
+    yield '['
+    for index, item in enumerate(items):
+        yield (',' if index else '') + json.dumps(
+            {
+                'name': item['ingredient__name'],
+                'amount': item['total_amount'],
+                'measurement_unit': item['ingredient__measurement_unit'],
+            },
+            ensure_ascii=False
+        )
+    yield ']'
+
+
+# Потоковые форматы: документ формируется по мере чтения строк из БД и не
+# собирается в памяти целиком.
+STREAMS = {
+    'txt': stream_txt,
+    'csv': stream_csv,
+    'json': stream_json,
+}
+
+
+def cache_stream(chunks, key):
+    """Отдаёт фрагменты документа и после последнего сохраняет его в кэш."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    cache.set(key, ''.join(parts), SHOPPING_LIST_CACHE_TIMEOUT)
+
+
+def get_document(user, file_format):
+    """
+    Возвращает список покупок в заданном формате: содержимое PDF или
+    итератор фрагментов для потоковых форматов. Агрегат и готовый документ
+    кэшируются по версии корзины, поэтому повторная выгрузка без изменений
+    корзины обходится без запросов к БД.
+    """
+    version = get_shopping_cart_version(user.id)
+    document_key = f'shopping_list:{user.id}:{version}:{file_format}'
+    document = cache.get(document_key)
+    if document is not None:
+        return document if file_format == 'pdf' else iter((document,))
+    items_key = f'shopping_list:{user.id}:{version}'
+    items = cache.get(items_key)
+    if items is None:
+        items = list(get_shopping_list(user))
+        cache.set(items_key, items, SHOPPING_LIST_CACHE_TIMEOUT)
+    if file_format == 'pdf':
+        document = render(items)
+        cache.set(document_key, document, SHOPPING_LIST_CACHE_TIMEOUT)
+        return document
+    return cache_stream(STREAMS[file_format](items), document_key)
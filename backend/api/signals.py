@@ -0,0 +1,103 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Favorite, Ingredient, Recipe
+from recipes.signals import deleted_with, get_counter_delta
+from users.models import Subscription
+
+from .cache import (
+    auth_token_cache,
+    auth_token_user_keys,
+    delete_user_auth_tokens,
+    short_link_cache
+)
+from .search import ingredient_search_index
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    if instance.short_link_code:
+        short_link_cache.delete(instance.short_link_code)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    ingredient_search_index.invalidate()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    auth_token_cache.delete(instance.key)
+    auth_token_user_keys.delete(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, **kwargs):
+    # Кэш хранит пользователя вместе с токеном, поэтому после изменения
+    # пользователя (в том числе деактивации) запись удаляется.
+    if not created:
+        delete_user_auth_tokens((instance.pk,))
+
+
+def delete_user_auth_tokens_on_commit(user_ids):
+    # Записи удаляются после фиксации транзакции: иначе параллельный запрос
+    # успел бы снова закэшировать пользователя с прежними счётчиками.
+    transaction.on_commit(lambda: delete_user_auth_tokens(user_ids))
+
+
+# Счётчики пользователей обновляются через update() без post_save
+# пользователя, поэтому закэшированные пользователи сбрасываются здесь.
+@receiver((post_save, post_delete), sender=Subscription)
+def subscription_changed(sender, instance, signal, origin=None, **kwargs):
+    if get_counter_delta(signal, kwargs) and not deleted_with(origin, User):
+        delete_user_auth_tokens_on_commit(
+            (instance.user_id, instance.author_id)
+        )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_count_changed(sender, instance, signal, origin=None, **kwargs):
+    if get_counter_delta(signal, kwargs) and not deleted_with(origin, User):
+        delete_user_auth_tokens_on_commit((instance.author_id,))
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def favorite_changed(sender, instance, signal, origin=None, **kwargs):
+    if get_counter_delta(signal, kwargs) and not deleted_with(
+        origin, Recipe, User
+    ):
+        delete_user_auth_tokens_on_commit((instance.user_id,))
+
+
+# При удалении рецепта или пользователя связи удаляются каскадом, а
+# счётчики меняются группами в pre_delete (см. recipes.signals и
+# users.signals): пользователи с изменившимися счётчиками выбираются одним
+# запросом.
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    user_ids = list(
+        Favorite.objects.filter(
+            recipe=instance
+        ).order_by().values_list('user', flat=True)
+    )
+    if user_ids:
+        delete_user_auth_tokens_on_commit(user_ids)
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    user_ids = {
+        user_id
+        for subscription in Subscription.objects.filter(
+            Q(user=instance) | Q(author=instance)
+        ).order_by().values_list('user', 'author')
+        for user_id in subscription
+    } - {instance.pk}
+    if user_ids:
+        delete_user_auth_tokens_on_commit(user_ids)
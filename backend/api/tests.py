@@ -1,6 +1,69 @@
+from datetime import timedelta
 from http import HTTPStatus
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest import mock, skipUnless
 
-from django.test import Client, TestCase
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from foodgram.constants import (
+    RECIPE_SHORT_LINK_CODE_MAX_LENGTH,
+    SHOPPING_LIST_JOB_RETENTION,
+    SHOPPING_LIST_JOB_TIMEOUT
+)
+from recipes.feed import FEED_ORDERING, get_timeline_feed
+from recipes.management.commands.load_ingredients import (
+    INGREDIENT_UNIQUE_CONSTRAINT,
+    load_with_copy
+)
+from recipes.models import (
+    Favorite,
+    FeedEntry,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingListJob,
+    ShortLinkCode,
+    Tag
+)
+from recipes.utils import assign_short_link_code, get_shopping_cart_version
+from users.models import Subscription
+from users.views import UserViewSet
+
+from .benchmarks import execute_on_commit
+from .cache import (
+    auth_token_cache,
+    auth_token_user_keys,
+    reference_data_cache,
+    registered_caches,
+    short_link_cache
+)
+from .middleware import QueryInstrumentationMiddleware
+from .query_budgets import QUERY_BUDGETS, UNBUDGETED_ACTIONS
+from .search import ingredient_search_index, search_ingredients
+from .urls import router
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+User = get_user_model()
+
+# Изображение 1×1 PNG для запросов на создание и изменение рецептов.
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1Pe'
+    'AAAADElEQVR4nGP4z8AAAAMBAQDJ/pLvAAAAAElFTkSuQmCC'
+)
 
 
 class FoodgramAPITestCase(TestCase):
@@ -12,3 +75,1868 @@ class FoodgramAPITestCase(TestCase):
         """Проверка доступности списка рецептов."""
         response = self.guest_client.get('/api/recipes/')
         self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+def create_recipes(author, count, tags, ingredients, prefix='Рецепт'):
+    """Создаёт рецепты автора с заданными тегами и ингредиентами."""
+    recipes = []
+    for index in range(count):
+        recipe = Recipe.objects.create(
+            author=author,
+            name=f'{prefix} {author.username} {index}',
+            image='recipe_images/test.png',
+            text='Описание',
+            cooking_time=10
+        )
+        recipe.tags.set(tags)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in ingredients
+        )
+        recipes.append(recipe)
+    return recipes
+
+
+class TemporaryMediaMixin:
+    """Сохраняет загружаемые файлы во временный каталог."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        media_root = TemporaryDirectory()
+        cls.addClassCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        cls.addClassCleanup(media_settings.disable)
+
+
+class BaseRecipeTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {index}', slug=f'tag{index}')
+            for index in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {index}', measurement_unit='г'
+            )
+            for index in range(5)
+        ]
+        cls.authors = [
+            User.objects.create(
+                username=f'author{index}', email=f'author{index}@example.com'
+            )
+            for index in range(3)
+        ]
+
+    def setUp(self):
+        self.guest_client = Client()
+
+
+class RecipeListQueriesTestCase(BaseRecipeTestCase):
+
+    def test_list_query_count_does_not_depend_on_page_size(self):
+        """
+        Количество запросов списка рецептов не зависит от числа рецептов
+        на странице.
+        """
+        # Подсчёт, выборка рецептов, теги и ингредиенты.
+        expected_queries = 4
+        for author in self.authors:
+            create_recipes(author, 2, self.tags, self.ingredients)
+            with self.assertNumQueries(expected_queries):
+                response = self.guest_client.get('/api/recipes/?limit=100')
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class RecipePaginationTestCase(BaseRecipeTestCase):
+
+    def test_cursor_pagination_walks_all_recipes(self):
+        """Курсорная пагинация отдаёт все рецепты без повторов."""
+        for author in self.authors:
+            create_recipes(author, 3, self.tags, self.ingredients)
+        expected_ids = list(
+            Recipe.objects.order_by('-created_at', '-id').values_list(
+                'id', flat=True
+            )
+        )
+        received_ids = []
+        url = '/api/recipes/?cursor=&limit=4'
+        while url:
+            response = self.guest_client.get(url)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            self.assertNotIn('count', response.json())
+            received_ids += [
+                recipe['id'] for recipe in response.json()['results']
+            ]
+            url = response.json()['next']
+        self.assertEqual(received_ids, expected_ids)
+
+    def test_cursor_pagination_with_equal_timestamps(self):
+        """
+        Рецепты с одинаковым временем публикации разбиваются на страницы по
+        (created_at, id) без OFFSET в обе стороны.
+        """
+        create_recipes(self.authors[0], 5, self.tags, self.ingredients)
+        Recipe.objects.update(created_at=timezone.now())
+        expected_ids = list(
+            Recipe.objects.order_by('-id').values_list('id', flat=True)
+        )
+        pages = []
+        url = '/api/recipes/?cursor=&limit=2'
+        with CaptureQueriesContext(connection) as context:
+            while url:
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                pages.append([
+                    recipe['id'] for recipe in response.json()['results']
+                ])
+                previous_url = response.json()['previous']
+                url = response.json()['next']
+        self.assertEqual(sum(pages, []), expected_ids)
+        self.assertFalse(any(
+            'OFFSET' in query['sql'] for query in context.captured_queries
+        ))
+        response = self.guest_client.get(previous_url)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['results']],
+            pages[-2]
+        )
+
+    def test_invalid_cursor(self):
+        response = self.guest_client.get('/api/recipes/?cursor=abc')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_page_number_pagination_is_default(self):
+        """Без параметра cursor используется постраничная пагинация."""
+        create_recipes(self.authors[0], 3, self.tags, self.ingredients)
+        response = self.guest_client.get('/api/recipes/?page=2&limit=2')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['count'], 3)
+        self.assertEqual(len(response.json()['results']), 1)
+
+
+class RecipeWriteSerializerTestCase(TemporaryMediaMixin, BaseRecipeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.author = self.authors[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def get_recipe_data(self, ingredients, tags):
+        return {
+            'ingredients': ingredients,
+            'tags': tags,
+            'image': IMAGE,
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+        }
+
+    def get_expected_errors(self, values):
+        """Ошибки стандартного PrimaryKeyRelatedField для тех же значений."""
+        field = serializers.PrimaryKeyRelatedField(
+            queryset=Tag.objects.all(), many=True
+        )
+        with self.assertRaises(serializers.ValidationError) as context:
+            field.run_validation(values)
+        return context.exception.detail
+
+    def test_invalid_ids_errors_match_primary_key_field(self):
+        tag_id = self.tags[0].id
+        for values in ([tag_id, 999], ['abc'], [True], [tag_id, None]):
+            with self.subTest(values=values):
+                response = self.client.post(
+                    '/api/recipes/',
+                    self.get_recipe_data(
+                        [{'id': self.ingredients[0].id, 'amount': 1}],
+                        values
+                    ),
+                    format='json'
+                )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.BAD_REQUEST
+                )
+                self.assertEqual(
+                    response.data['tags'], self.get_expected_errors(values)
+                )
+
+    def test_missing_ingredient_error(self):
+        response = self.client.post(
+            '/api/recipes/',
+            self.get_recipe_data(
+                [
+                    {'id': self.ingredients[0].id, 'amount': 1},
+                    {'id': 999, 'amount': 1},
+                ],
+                [self.tags[0].id]
+            ),
+            format='json'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(
+            response.data['ingredients'],
+            [{}, {'id': self.get_expected_errors([999])}]
+        )
+
+    def test_update_response_keeps_user_flags(self):
+        """
+        Ответ на изменение рецепта содержит признаки избранного и корзины
+        автора, вычисленные при загрузке рецепта.
+        """
+        recipe = create_recipes(
+            self.author, 1, self.tags, self.ingredients[:1]
+        )[0]
+        Favorite.objects.create(user=self.author, recipe=recipe)
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/',
+            self.get_recipe_data(
+                [{'id': self.ingredients[0].id, 'amount': 1}],
+                [self.tags[0].id]
+            ),
+            format='json'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.data['is_favorited'])
+        self.assertFalse(response.data['is_in_shopping_cart'])
+        self.assertEqual(response.data['author']['id'], self.author.id)
+        self.assertFalse(response.data['author']['is_subscribed'])
+
+    def test_removing_ingredients_bumps_carts_once(self):
+        """
+        Удаление любого числа ингредиентов стоит одинакового числа
+        запросов и увеличивает версию корзины один раз.
+        """
+        counts = []
+        for removed in (1, 4):
+            recipe = create_recipes(
+                self.author, 1, self.tags, self.ingredients,
+                prefix=f'Рецепт {removed}'
+            )[0]
+            ShoppingCart.objects.create(user=self.authors[1], recipe=recipe)
+            version = get_shopping_cart_version(self.authors[1].id)
+            data = self.get_recipe_data(
+                [
+                    {'id': ingredient.id, 'amount': 1}
+                    for ingredient in self.ingredients[removed:]
+                ],
+                [tag.id for tag in self.tags]
+            )
+            data['name'] = recipe.name
+            with CaptureQueriesContext(connection) as context:
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.patch(
+                        f'/api/recipes/{recipe.id}/', data, format='json'
+                    )
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            self.assertEqual(
+                recipe.recipe_ingredients.count(),
+                len(self.ingredients) - removed
+            )
+            self.assertEqual(
+                get_shopping_cart_version(self.authors[1].id), version + 1
+            )
+            counts.append(len(context))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_update_changes_only_different_ingredients(self):
+        """
+        При обновлении рецепта строки с прежним количеством не меняются,
+        изменённые обновляются, лишние удаляются, новые добавляются.
+        """
+        recipe = create_recipes(self.author, 1, self.tags, [])[0]
+        unchanged, changed, removed = RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient=ingredient, amount=amount
+            )
+            for ingredient, amount in zip(self.ingredients, (10, 20, 30))
+        )
+        with mock.patch.object(
+            RecipeIngredient.objects, 'bulk_update',
+            wraps=RecipeIngredient.objects.bulk_update
+        ) as bulk_update:
+            response = self.client.patch(
+                f'/api/recipes/{recipe.id}/',
+                self.get_recipe_data(
+                    [
+                        {'id': self.ingredients[0].id, 'amount': 10},
+                        {'id': self.ingredients[1].id, 'amount': 25},
+                        {'id': self.ingredients[3].id, 'amount': 40},
+                    ],
+                    [self.tags[0].id]
+                ),
+                format='json'
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            set(
+                recipe.recipe_ingredients.values_list(
+                    'id', 'ingredient', 'amount'
+                )
+            ),
+            {
+                (unchanged.id, self.ingredients[0].id, 10),
+                (changed.id, self.ingredients[1].id, 25),
+                (
+                    recipe.recipe_ingredients.get(
+                        ingredient=self.ingredients[3]
+                    ).id,
+                    self.ingredients[3].id,
+                    40
+                ),
+            }
+        )
+        self.assertFalse(
+            RecipeIngredient.objects.filter(id=removed.id).exists()
+        )
+        # Обновляется только строка с изменённым количеством.
+        bulk_update.assert_called_once()
+        self.assertEqual(
+            [
+                recipe_ingredient.id
+                for recipe_ingredient in bulk_update.call_args.args[0]
+            ],
+            [changed.id]
+        )
+
+
+class ShortLinkRedirectTestCase(BaseRecipeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        short_link_cache.clear()
+        self.recipe = create_recipes(
+            self.authors[0], 1, self.tags, self.ingredients
+        )[0]
+        self.recipe.short_link_code = 'abc'
+        self.recipe.save(update_fields=('short_link_code',))
+
+    def test_redirect_is_served_from_cache(self):
+        """Повторный переход по короткой ссылке не обращается к БД."""
+        response = self.guest_client.get('/s/abc/')
+        self.assertRedirects(
+            response,
+            f'/recipes/{self.recipe.id}/',
+            fetch_redirect_response=False
+        )
+        with self.assertNumQueries(0):
+            response = self.guest_client.get('/s/abc/')
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_cache_is_invalidated_on_recipe_delete(self):
+        """После удаления рецепта короткая ссылка перестаёт работать."""
+        self.guest_client.get('/s/abc/')
+        self.recipe.delete()
+        response = self.guest_client.get('/s/abc/')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class ShortLinkCodeTestCase(BaseRecipeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipe, self.other_recipe = create_recipes(
+            self.authors[0], 2, self.tags, self.ingredients
+        )
+        ShortLinkCode.objects.bulk_create(
+            ShortLinkCode(code=code) for code in ('aaa', 'bbb')
+        )
+
+    def get_pool(self):
+        return list(ShortLinkCode.objects.values_list('code', flat=True))
+
+    def test_code_is_taken_from_pool(self):
+        self.assertEqual(assign_short_link_code(self.recipe), 'aaa')
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.short_link_code, 'aaa')
+        self.assertEqual(self.get_pool(), ['bbb'])
+        # Повторный вызов не меняет выданный код.
+        self.assertEqual(assign_short_link_code(self.recipe), 'aaa')
+        self.assertEqual(self.get_pool(), ['bbb'])
+
+    def test_used_code_is_skipped(self):
+        """Занятый код удаляется из пула, выдаётся следующий."""
+        Recipe.objects.filter(id=self.other_recipe.id).update(
+            short_link_code='aaa'
+        )
+        self.assertEqual(assign_short_link_code(self.recipe), 'bbb')
+        self.assertEqual(self.get_pool(), [])
+
+    def test_released_code_is_not_reused_before_cache_expires(self):
+        """
+        Код удалённого рецепта возвращается в пул, но не выдаётся, пока
+        в процессах может оставаться закэшированное перенаправление.
+        """
+        ShortLinkCode.objects.all().delete()
+        Recipe.objects.filter(id=self.other_recipe.id).update(
+            short_link_code='ccc'
+        )
+        Recipe.objects.get(id=self.other_recipe.id).delete()
+        released_code = ShortLinkCode.objects.get(code='ccc')
+        self.assertGreater(released_code.available_at, timezone.now())
+        with self.assertLogs('recipes.utils', 'WARNING'):
+            self.assertNotEqual(assign_short_link_code(self.recipe), 'ccc')
+        recipe = create_recipes(
+            self.authors[1], 1, self.tags, self.ingredients
+        )[0]
+        released_code.available_at = timezone.now()
+        released_code.save()
+        self.assertEqual(assign_short_link_code(recipe), 'ccc')
+
+    def test_empty_pool_is_not_refilled_in_request(self):
+        """
+        При пустом пуле код выбирается случайно, а пул пополняется только
+        командой.
+        """
+        ShortLinkCode.objects.all().delete()
+        # Выборка из пула, проверка случайного кода и обновление рецепта
+        # (с точками сохранения), без чтения всех занятых кодов.
+        with self.assertLogs('recipes.utils', 'WARNING'):
+            with self.assertNumQueries(7):
+                code = assign_short_link_code(self.recipe)
+        self.assertEqual(len(code), RECIPE_SHORT_LINK_CODE_MAX_LENGTH)
+        self.assertEqual(self.get_pool(), [])
+        call_command(
+            'fill_short_link_code_pool', '--count', '5', stdout=StringIO()
+        )
+        pool = self.get_pool()
+        self.assertEqual(len(pool), 5)
+        self.assertNotIn(code, pool)
+
+    def test_fill_command_top_up(self):
+        """Повторный запуск при деплое не раздувает пул."""
+        ShortLinkCode.objects.all().delete()
+        for _ in range(2):
+            call_command(
+                'fill_short_link_code_pool', '--count', '5', '--top-up',
+                stdout=StringIO()
+            )
+        self.assertEqual(len(self.get_pool()), 5)
+
+
+class ShoppingListDownloadTestCase(TemporaryMediaMixin, BaseRecipeTestCase):
+    url = '/api/recipes/download_shopping_cart/'
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create(
+            username='buyer', email='buyer@example.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for recipe in create_recipes(
+            self.authors[0], 2, self.tags, self.ingredients[:2]
+        ):
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+
+    def download(self, query='', **extra):
+        response = self.client.get(self.url + query, **extra)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return response, b''.join(response.streaming_content)
+
+    def test_pdf_is_default_whatever_accept_header(self):
+        for accept in ('*/*', 'application/json', 'text/csv'):
+            with self.subTest(accept=accept):
+                response, body = self.download(HTTP_ACCEPT=accept)
+                self.assertEqual(response['Content-Type'], 'application/pdf')
+                self.assertTrue(body.startswith(b'%PDF'))
+
+    def test_streaming_formats(self):
+        expected = {
+            'txt': (
+                'text/plain; charset=utf-8',
+                'Список покупок\n\n'
+                '• Ингредиент 0 — 2 г\n'
+                '• Ингредиент 1 — 2 г\n'
+            ),
+            'csv': (
+                'text/csv; charset=utf-8',
+                'Ингредиент,Количество,Единица измерения\r\n'
+                'Ингредиент 0,2,г\r\n'
+                'Ингредиент 1,2,г\r\n'
+            ),
+            'json': (
+                'application/json; charset=utf-8',
+                '[{"name": "Ингредиент 0", "amount": 2, '
+                '"measurement_unit": "г"},'
+                '{"name": "Ингредиент 1", "amount": 2, '
+                '"measurement_unit": "г"}]'
+            ),
+        }
+        for file_format, (content_type, content) in expected.items():
+            with self.subTest(format=file_format):
+                response, body = self.download(f'?format={file_format}')
+                self.assertEqual(response['Content-Type'], content_type)
+                self.assertEqual(body.decode(), content)
+
+    def test_cached_list_is_invalidated(self):
+        """
+        Кэш списка покупок сбрасывается при изменении корзины, состава
+        рецепта (в том числе из админки) и ингредиентов.
+        """
+        recipe = self.user.shoppingcart_recipes.first().recipe
+        ingredient = self.ingredients[0]
+
+        def change_amount():
+            recipe_ingredient = recipe.recipe_ingredients.get(
+                ingredient=ingredient
+            )
+            recipe_ingredient.amount = 10
+            recipe_ingredient.save()
+
+        def rename_ingredient():
+            ingredient.name = 'Ингредиент 0 новый'
+            ingredient.save()
+
+        def update_recipe():
+            author_client = APIClient()
+            author_client.force_authenticate(recipe.author)
+            response = author_client.patch(
+                f'/api/recipes/{recipe.id}/',
+                {
+                    'ingredients': [
+                        {'id': ingredient.id, 'amount': 5},
+                        {'id': self.ingredients[2].id, 'amount': 1},
+                    ],
+                    'tags': [self.tags[0].id],
+                    'image': IMAGE,
+                },
+                format='json'
+            )
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+
+        for change, line in (
+            (change_amount, 'Ингредиент 0,11,г'),
+            (rename_ingredient, 'Ингредиент 0 новый,11,г'),
+            (
+                lambda: recipe.recipe_ingredients.filter(
+                    ingredient=self.ingredients[1]
+                ).delete(),
+                'Ингредиент 1,1,г'
+            ),
+            (update_recipe, 'Ингредиент 2,1,г'),
+            (
+                lambda: ShoppingCart.objects.filter(
+                    user=self.user, recipe=recipe
+                ).delete(),
+                'Ингредиент 0 новый,1,г'
+            ),
+        ):
+            with self.subTest(change=change.__name__):
+                self.download('?format=csv')
+                with self.captureOnCommitCallbacks(execute=True):
+                    change()
+                _, body = self.download('?format=csv')
+                self.assertIn(line, body.decode().splitlines())
+
+    def test_errors_are_json(self):
+        """Ошибки отдаются в JSON, а не в формате документа."""
+        for client, query, expected_status in (
+            (APIClient(), '', HTTPStatus.UNAUTHORIZED),
+            (APIClient(), '?format=csv', HTTPStatus.UNAUTHORIZED),
+            (self.client, '?format=xml', HTTPStatus.NOT_FOUND),
+        ):
+            with self.subTest(query=query, status=expected_status):
+                response = client.get(self.url + query)
+                self.assertEqual(response.status_code, expected_status)
+                self.assertEqual(
+                    response['Content-Type'], 'application/json'
+                )
+                self.assertIn('detail', response.json())
+
+
+class ShoppingListJobTestCase(TemporaryMediaMixin, BaseRecipeTestCase):
+    url = '/api/recipes/download_shopping_cart/jobs/'
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(
+            username='buyer', email='buyer@example.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        recipe = create_recipes(
+            self.authors[0], 1, self.tags, self.ingredients
+        )[0]
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+
+    def process_jobs(self):
+        call_command('process_shopping_list_jobs', '--once', stdout=StringIO())
+
+    def test_job_is_processed(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, HTTPStatus.ACCEPTED)
+        job_url = f'{self.url}{response.data["id"]}/'
+        response = self.client.get(job_url)
+        self.assertEqual(response.status_code, HTTPStatus.ACCEPTED)
+        self.assertEqual(response.data['status'], 'pending')
+        self.process_jobs()
+        response = self.client.get(job_url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(
+            b''.join(response.streaming_content).startswith(b'%PDF')
+        )
+
+    def test_other_users_job_is_not_found(self):
+        job = ShoppingListJob.objects.create(user=self.authors[0])
+        response = self.client.get(f'{self.url}{job.id}/')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_stale_processing_job_is_reclaimed(self):
+        """Задание упавшего обработчика забирается повторно."""
+        now = timezone.now()
+        stale_job, fresh_job = ShoppingListJob.objects.bulk_create((
+            ShoppingListJob(
+                user=self.user,
+                status=ShoppingListJob.Status.PROCESSING,
+                started_at=now - timedelta(
+                    seconds=SHOPPING_LIST_JOB_TIMEOUT + 1
+                )
+            ),
+            ShoppingListJob(
+                user=self.user,
+                status=ShoppingListJob.Status.PROCESSING,
+                started_at=now
+            ),
+        ))
+        self.process_jobs()
+        stale_job.refresh_from_db()
+        fresh_job.refresh_from_db()
+        self.assertEqual(stale_job.status, ShoppingListJob.Status.DONE)
+        self.assertEqual(
+            fresh_job.status, ShoppingListJob.Status.PROCESSING
+        )
+
+    def test_expired_jobs_are_deleted_with_files(self):
+        self.client.post(self.url)
+        self.process_jobs()
+        job = ShoppingListJob.objects.get()
+        storage, name = job.file.storage, job.file.name
+        self.assertTrue(storage.exists(name))
+        ShoppingListJob.objects.filter(id=job.id).update(
+            finished_at=timezone.now() - timedelta(
+                seconds=SHOPPING_LIST_JOB_RETENTION + 1
+            )
+        )
+        self.process_jobs()
+        self.assertFalse(ShoppingListJob.objects.exists())
+        self.assertFalse(storage.exists(name))
+
+
+class CountersTestCase(BaseRecipeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.author, self.reader = self.authors[:2]
+        self.recipe = create_recipes(
+            self.author, 1, self.tags, self.ingredients
+        )[0]
+
+    def assert_counters(self, recipe_counters, author_counters,
+                        reader_counters):
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.reader.refresh_from_db()
+        self.assertEqual(
+            (self.recipe.favorites_count, self.recipe.shopping_carts_count),
+            recipe_counters
+        )
+        for user, counters in (
+            (self.author, author_counters),
+            (self.reader, reader_counters)
+        ):
+            self.assertEqual(
+                (
+                    user.recipes_count,
+                    user.subscriptions_count,
+                    user.subscribers_count,
+                    user.favorite_recipes_count
+                ),
+                counters
+            )
+
+    def test_counters_follow_relation_changes(self):
+        """Счётчики изменяются при создании и удалении связей."""
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+        Subscription.objects.create(user=self.reader, author=self.author)
+        self.assert_counters((1, 1), (1, 0, 1, 0), (0, 1, 0, 1))
+        Favorite.objects.filter(user=self.reader).delete()
+        Subscription.objects.filter(user=self.reader).delete()
+        self.assert_counters((0, 1), (1, 0, 0, 0), (0, 0, 0, 0))
+        self.recipe.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 0)
+
+    def test_counters_do_not_go_below_zero(self):
+        """
+        Удаление связи при счётчиках, разошедшихся с данными до нуля, не
+        нарушает ограничение PositiveIntegerField.
+        """
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+        Subscription.objects.create(user=self.reader, author=self.author)
+        Recipe.objects.update(favorites_count=0, shopping_carts_count=0)
+        User.objects.update(
+            recipes_count=0,
+            subscriptions_count=0,
+            subscribers_count=0,
+            favorite_recipes_count=0
+        )
+        Favorite.objects.all().delete()
+        ShoppingCart.objects.all().delete()
+        Subscription.objects.all().delete()
+        self.assert_counters((0, 0), (0, 0, 0, 0), (0, 0, 0, 0))
+        self.recipe.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 0)
+
+    def get_recipe_deletion_query_count(self, users_count):
+        recipe = create_recipes(
+            self.author, 1, self.tags, self.ingredients, f'У{users_count}'
+        )[0]
+        users = [
+            User.objects.create(
+                username=f'user{users_count}_{index}',
+                email=f'user{users_count}_{index}@example.com'
+            )
+            for index in range(users_count)
+        ]
+        for user in users:
+            Favorite.objects.create(user=user, recipe=recipe)
+            ShoppingCart.objects.create(user=user, recipe=recipe)
+        versions = [get_shopping_cart_version(user.id) for user in users]
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                recipe.delete()
+        for user, version in zip(users, versions):
+            user.refresh_from_db()
+            self.assertEqual(user.favorite_recipes_count, 0)
+            self.assertEqual(
+                get_shopping_cart_version(user.id), version + 1
+            )
+        return len(context)
+
+    def test_recipe_deletion_query_count_does_not_depend_on_relations(self):
+        """
+        Удаление рецепта меняет счётчики и версии корзин пользователей
+        группой, а не по строке избранного и корзины.
+        """
+        self.assertEqual(
+            self.get_recipe_deletion_query_count(1),
+            self.get_recipe_deletion_query_count(5)
+        )
+
+    def test_user_deletion_updates_counters(self):
+        """Удаление пользователя уменьшает счётчики связанных объектов."""
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+        Subscription.objects.create(user=self.reader, author=self.author)
+        Subscription.objects.create(user=self.author, author=self.reader)
+        self.assert_counters((1, 1), (1, 1, 1, 0), (0, 1, 1, 1))
+        self.reader.delete()
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(
+            (self.recipe.favorites_count, self.recipe.shopping_carts_count),
+            (0, 0)
+        )
+        self.assertEqual(
+            (
+                self.author.recipes_count,
+                self.author.subscriptions_count,
+                self.author.subscribers_count
+            ),
+            (1, 0, 0)
+        )
+        follower = self.authors[2]
+        Favorite.objects.create(user=follower, recipe=self.recipe)
+        Subscription.objects.create(user=follower, author=self.author)
+        self.author.delete()
+        follower.refresh_from_db()
+        self.assertEqual(
+            (follower.subscriptions_count, follower.favorite_recipes_count),
+            (0, 0)
+        )
+
+    def test_recompute_counters_repairs_drift(self):
+        """Команда recompute_counters восстанавливает рассинхронизацию."""
+        Favorite.objects.bulk_create(
+            (Favorite(user=self.reader, recipe=self.recipe),)
+        )
+        Subscription.objects.bulk_create(
+            (Subscription(user=self.reader, author=self.author),)
+        )
+        User.objects.update(recipes_count=7)
+        call_command('recompute_counters', stdout=StringIO())
+        self.assert_counters((1, 0), (1, 0, 1, 0), (0, 1, 0, 1))
+
+
+class AdminChangelistQueriesTestCase(BaseRecipeTestCase):
+    CHANGELIST_URLS = (
+        '/admin/recipes/recipe/',
+        '/admin/recipes/recipeingredient/',
+        '/admin/recipes/favorite/',
+        '/admin/recipes/shoppingcart/',
+        '/admin/recipes/shoppinglistjob/',
+        '/admin/users/user/',
+        '/admin/users/subscription/',
+    )
+
+    def setUp(self):
+        super().setUp()
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        )
+        self.admin_client = Client()
+        self.admin_client.force_login(admin)
+
+    def add_rows(self, author, reader):
+        for recipe in create_recipes(
+            author, 2, self.tags, self.ingredients, prefix=reader.username
+        ):
+            Favorite.objects.create(user=reader, recipe=recipe)
+            ShoppingCart.objects.create(user=reader, recipe=recipe)
+        Subscription.objects.create(user=reader, author=author)
+        ShoppingListJob.objects.create(user=reader)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.admin_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return len(context)
+
+    def test_changelist_query_count_does_not_depend_on_rows(self):
+        """Число запросов страницы списка в админке не зависит от строк."""
+        self.add_rows(self.authors[0], self.authors[1])
+        counts = {url: self.count_queries(url) for url in self.CHANGELIST_URLS}
+        self.add_rows(self.authors[1], self.authors[2])
+        self.add_rows(self.authors[2], self.authors[0])
+        for url, count in counts.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), count)
+
+
+class SubscriptionsTestCase(BaseRecipeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.reader = User.objects.create(
+            username='reader', email='reader@example.com'
+        )
+        self.reader_client = APIClient()
+        self.reader_client.force_authenticate(self.reader)
+
+    def subscribe(self, author, recipes_count):
+        create_recipes(author, recipes_count, self.tags, self.ingredients)
+        Subscription.objects.create(user=self.reader, author=author)
+
+    def test_recipes_limit_applies_to_each_author(self):
+        """recipes_limit ограничивает рецепты каждого автора отдельно."""
+        for author, recipes_count in zip(self.authors, (1, 3, 5)):
+            self.subscribe(author, recipes_count)
+        response = self.reader_client.get(
+            '/api/users/subscriptions/', {'recipes_limit': 2}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        results = {
+            author['username']: author
+            for author in response.json()['results']
+        }
+        for author, recipes_count in zip(self.authors, (1, 3, 5)):
+            data = results[author.username]
+            self.assertEqual(data['recipes_count'], recipes_count)
+            self.assertTrue(data['is_subscribed'])
+            self.assertEqual(
+                [recipe['id'] for recipe in data['recipes']],
+                list(
+                    author.recipes.order_by(
+                        '-created_at', '-id'
+                    ).values_list('id', flat=True)[:2]
+                )
+            )
+
+    def test_subscriptions_query_count_does_not_depend_on_authors(self):
+        """Число запросов не зависит от количества авторов на странице."""
+        self.subscribe(self.authors[0], 3)
+        with CaptureQueriesContext(connection) as context:
+            response = self.reader_client.get(
+                '/api/users/subscriptions/', {'recipes_limit': 2}
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        for author in self.authors[1:]:
+            self.subscribe(author, 3)
+        with self.assertNumQueries(len(context)):
+            self.reader_client.get(
+                '/api/users/subscriptions/', {'recipes_limit': 2}
+            )
+
+
+@mock.patch('recipes.feed.FEED_TIMELINE_MIN_SUBSCRIPTIONS', 2)
+class FeedTestCase(BaseRecipeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.reader = User.objects.create(
+            username='reader', email='reader@example.com'
+        )
+        self.reader_client = APIClient()
+        self.reader_client.force_authenticate(self.reader)
+        for author in self.authors:
+            create_recipes(author, 3, self.tags, self.ingredients)
+
+    def get_feed_ids(self):
+        ids = []
+        # Ссылка next уже содержит limit и курсор.
+        url = '/api/recipes/feed/?limit=2'
+        while url:
+            response = self.reader_client.get(url)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            ids += [recipe['id'] for recipe in response.json()['results']]
+            url = response.json()['next']
+        return ids
+
+    def get_expected_ids(self, authors):
+        return list(
+            Recipe.objects.filter(author__in=authors).order_by(
+                '-created_at', '-id'
+            ).values_list('id', flat=True)
+        )
+
+    def test_fan_out_feed(self):
+        """Лента без материализации содержит рецепты авторов из подписок."""
+        Subscription.objects.create(user=self.reader, author=self.authors[0])
+        self.assertEqual(
+            self.get_feed_ids(), self.get_expected_ids(self.authors[:1])
+        )
+        self.assertFalse(FeedEntry.objects.exists())
+
+    def test_timeline_follows_subscriptions_and_recipes(self):
+        """Материализованная лента обновляется при подписках и публикации."""
+        for author in self.authors:
+            Subscription.objects.create(user=self.reader, author=author)
+        create_recipes(self.authors[0], 1, self.tags, self.ingredients, 'Н')
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(),
+            Recipe.objects.count()
+        )
+        self.assertEqual(
+            self.get_feed_ids(), self.get_expected_ids(self.authors)
+        )
+        Subscription.objects.filter(author=self.authors[2]).delete()
+        self.assertEqual(
+            self.get_feed_ids(), self.get_expected_ids(self.authors[:2])
+        )
+        Subscription.objects.filter(author=self.authors[1]).delete()
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(
+            self.get_feed_ids(), self.get_expected_ids(self.authors[:1])
+        )
+
+    def test_author_deletion_drops_short_timelines(self):
+        """
+        Подписчики удалённого автора, опустившиеся ниже порога, снова
+        собирают ленту при чтении.
+        """
+        for author in self.authors:
+            Subscription.objects.create(user=self.reader, author=author)
+        self.authors[2].delete()
+        self.assertEqual(
+            self.get_feed_ids(), self.get_expected_ids(self.authors[:2])
+        )
+        self.authors[1].delete()
+        self.reader.refresh_from_db()
+        self.assertFalse(self.reader.has_feed_timeline)
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(
+            self.get_feed_ids(), self.get_expected_ids(self.authors[:1])
+        )
+
+    def test_timeline_is_paginated_on_feed_entries(self):
+        """
+        Материализованная лента упорядочивается и разбивается на страницы
+        по столбцам FeedEntry, а не по времени публикации рецептов.
+        """
+        for author in self.authors:
+            Subscription.objects.create(user=self.reader, author=author)
+        self.assertFalse(
+            FeedEntry.objects.exclude(
+                created_at=F('recipe__created_at')
+            ).exists()
+        )
+        response = self.reader_client.get('/api/recipes/feed/?limit=2')
+        with CaptureQueriesContext(connection) as context:
+            self.reader_client.get(response.json()['next'])
+        page_sql = next(
+            query['sql'] for query in context.captured_queries
+            if 'ORDER BY' in query['sql']
+        )
+        # Сортировка идёт по аннотациям ленты, взятым из записи FeedEntry,
+        # условие курсора — по её же столбцам в том же соединении.
+        self.assertIn(
+            '"recipes_feed_entries"."created_at" AS "feed_created_at"',
+            page_sql
+        )
+        self.assertIn('"recipes_feed_entries"."created_at" <', page_sql)
+        self.assertEqual(page_sql.count('JOIN "recipes_feed_entries"'), 1)
+
+    def test_feed_is_chosen_by_flag(self):
+        """
+        Способ чтения ленты определяется флагом материализации, а не
+        счётчиком подписок, который мог разойтись с данными.
+        """
+        for author in self.authors:
+            Subscription.objects.create(user=self.reader, author=author)
+        self.reader.refresh_from_db()
+        self.assertTrue(self.reader.has_feed_timeline)
+        User.objects.filter(id=self.reader.id).update(subscriptions_count=0)
+        create_recipes(self.authors[0], 1, self.tags, self.ingredients, 'Н')
+        self.assertEqual(
+            self.get_feed_ids(), self.get_expected_ids(self.authors)
+        )
+
+    def test_recompute_counters_syncs_timelines(self):
+        """
+        recompute_counters строит ленты пользователей, достигших порога
+        подписками без сигналов, и удаляет ленты оказавшихся ниже порога.
+        """
+        Subscription.objects.bulk_create(
+            Subscription(user=self.reader, author=author)
+            for author in self.authors
+        )
+        self.assertFalse(FeedEntry.objects.exists())
+        call_command('recompute_counters', stdout=StringIO())
+        self.reader.refresh_from_db()
+        self.assertTrue(self.reader.has_feed_timeline)
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(),
+            Recipe.objects.count()
+        )
+        self.assertEqual(
+            self.get_feed_ids(), self.get_expected_ids(self.authors)
+        )
+        Subscription.objects.filter(
+            author__in=self.authors[1:]
+        ).delete()
+        User.objects.filter(id=self.reader.id).update(has_feed_timeline=True)
+        call_command('recompute_counters', stdout=StringIO())
+        self.reader.refresh_from_db()
+        self.assertFalse(self.reader.has_feed_timeline)
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(
+            self.get_feed_ids(), self.get_expected_ids(self.authors[:1])
+        )
+
+
+class LoadIngredientsTestCase(TestCase):
+
+    def test_load_csv_and_json(self):
+        """Повторная загрузка тех же данных из JSON ничего не добавляет."""
+        call_command('load_ingredients', stdout=StringIO())
+        count = Ingredient.objects.count()
+        self.assertGreater(count, 0)
+        output = StringIO()
+        call_command(
+            'load_ingredients',
+            settings.BASE_DIR.parent / 'data/ingredients.json',
+            stdout=output
+        )
+        self.assertIn('добавлено: 0', output.getvalue())
+        self.assertEqual(Ingredient.objects.count(), count)
+
+    def test_unique_constraint_exists(self):
+        """COPY ссылается на существующее ограничение уникальности."""
+        self.assertIn(
+            INGREDIENT_UNIQUE_CONSTRAINT,
+            [constraint.name for constraint in Ingredient._meta.constraints]
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY для PostgreSQL')
+    def test_load_with_copy(self):
+        """
+        COPY загружает значения с кавычками и запятыми и пропускает уже
+        существующие и повторяющиеся строки.
+        """
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+        rows = [
+            ('соль', 'г'),
+            ('соус "Ткемали"', 'мл'),
+            ('перец, молотый', 'г'),
+            ('перец, молотый', 'г'),
+        ]
+        self.assertEqual(load_with_copy(iter(rows)), (4, 2))
+        self.assertEqual(
+            set(Ingredient.objects.values_list('name', 'measurement_unit')),
+            set(rows)
+        )
+
+
+class SeedBenchmarkDataTestCase(TestCase):
+
+    def seed(self, prefix):
+        call_command(
+            'seed_benchmark_data',
+            prefix=prefix,
+            users=20,
+            authors=5,
+            recipes=30,
+            favorites=60,
+            carts=20,
+            subscriptions=40,
+            stdout=StringIO()
+        )
+        return Recipe.objects.filter(
+            author__username__startswith=f'{prefix}_'
+        )
+
+    def test_seeded_data_is_consistent(self):
+        """Набор данных воспроизводим, а счётчики пересчитаны."""
+        recipes = self.seed('first')
+        self.assertEqual(recipes.count(), 30)
+        for recipe in recipes.annotate(
+            ingredients_count=Count('recipe_ingredients', distinct=True),
+            favorites=Count('favorite_users', distinct=True)
+        ):
+            self.assertTrue(5 <= recipe.ingredients_count <= 30)
+            self.assertEqual(recipe.favorites_count, recipe.favorites)
+        self.assertEqual(
+            list(recipes.values_list('author__username', 'cooking_time')),
+            [
+                (username.replace('second_', 'first_'), cooking_time)
+                for username, cooking_time in self.seed(
+                    'second'
+                ).values_list('author__username', 'cooking_time')
+            ]
+        )
+
+    def test_api_benchmark_measures_commits_and_cold_shopping_lists(self):
+        """
+        Замер API выполняет функции on_commit, а выгрузка списка покупок
+        замеряется и с готовым кэшем, и без него.
+        """
+        self.seed('api')
+        callback = mock.Mock()
+        with transaction.atomic(), execute_on_commit():
+            transaction.on_commit(callback)
+        callback.assert_called_once()
+        output = StringIO()
+        call_command('benchmark', 'api', repeat=1, stdout=output)
+        queries = {
+            line.split('[')[1].split(']')[0]: int(
+                line.split('queries=')[1].split(',')[0]
+            )
+            for line in output.getvalue().splitlines()
+            if line.startswith('api [')
+        }
+        for file_format in ('pdf', 'csv'):
+            with self.subTest(file_format=file_format):
+                self.assertGreater(
+                    queries[f'shopping_list_{file_format}_cold'],
+                    queries[f'shopping_list_{file_format}']
+                )
+
+    def test_benchmark_without_data_prints_hint(self):
+        """
+        Замер API на пустой БД пропускается с подсказкой, остальные замеры
+        выполняются.
+        """
+        output = StringIO()
+        errors = StringIO()
+        call_command(
+            'benchmark', 'api', 'ingredient_search',
+            repeat=1, stdout=output, stderr=errors
+        )
+        self.assertIn('seed_benchmark_data', errors.getvalue())
+        self.assertNotIn('api [', output.getvalue())
+        self.assertIn('ingredient_search [', output.getvalue())
+
+
+@override_settings(
+    QUERY_INSTRUMENTATION_SAMPLE_RATE=1.0,
+    QUERY_INSTRUMENTATION_REPEATED_THRESHOLD=2
+)
+class QueryInstrumentationMiddlewareTestCase(BaseRecipeTestCase):
+
+    def test_server_timing_header(self):
+        """Ответ содержит заголовок Server-Timing с числом запросов."""
+        create_recipes(self.authors[0], 2, self.tags, self.ingredients)
+        with self.assertLogs('api.queries', 'INFO') as logs:
+            response = self.guest_client.get('/api/recipes/')
+        self.assertIn('4 queries, 0 repeated', response['Server-Timing'])
+        self.assertIn(
+            'path=/api/recipes/ status=200 queries=4', logs.output[0]
+        )
+
+    def test_repeated_queries_are_reported(self):
+        """Повторы одинакового SQL записываются в журнал как WARNING."""
+        def get_response(request):
+            for author in self.authors:
+                User.objects.filter(id=author.id).exists()
+            return HttpResponse()
+
+        middleware = QueryInstrumentationMiddleware(get_response)
+        with self.assertLogs('api.queries', 'WARNING') as logs:
+            middleware(RequestFactory().get('/'))
+        self.assertIn('repeated_queries=2', logs.output[0])
+        self.assertIn('most_repeated_count=3', logs.output[0])
+
+    @override_settings(QUERY_INSTRUMENTATION_SAMPLE_RATE=0.0)
+    def test_disabled_sampling(self):
+        """При нулевой доле запросы не замеряются и не журналируются."""
+        with mock.patch('api.middleware.logger') as logger:
+            for _ in range(10):
+                response = self.guest_client.get('/api/recipes/')
+                self.assertFalse(response.has_header('Server-Timing'))
+        logger.log.assert_not_called()
+
+
+class IngredientSearchTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in (
+                'Сгущённое молоко',
+                'Молоко',
+                'Кокосовое молоко',
+                'Молочный шоколад',
+                'Мука',
+            )
+        )
+
+    def setUp(self):
+        ingredient_search_index.invalidate()
+        reference_data_cache.clear()
+
+    def search(self, query):
+        response = self.client.get('/api/ingredients/', {'name': query})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_prefix_matches_go_first(self):
+        """
+        Сначала идут совпадения по началу названия, затем по вхождению,
+        внутри групп — по алфавиту, без учёта регистра.
+        """
+        self.assertEqual(
+            self.search('мол'),
+            [
+                'Молоко',
+                'Молочный шоколад',
+                'Кокосовое молоко',
+                'Сгущённое молоко',
+            ]
+        )
+
+    def test_results_are_limited(self):
+        self.assertEqual(
+            [
+                ingredient.name for ingredient in search_ingredients(
+                    Ingredient.objects.all(), 'мол', limit=3
+                )
+            ],
+            ['Молоко', 'Молочный шоколад', 'Кокосовое молоко']
+        )
+
+    def test_new_ingredient_is_found(self):
+        self.assertEqual(self.search('молоко'), [
+            'Молоко', 'Кокосовое молоко', 'Сгущённое молоко'
+        ])
+        Ingredient.objects.create(name='Молоко овсяное', measurement_unit='мл')
+        self.assertEqual(
+            self.search('молоко'),
+            [
+                'Молоко',
+                'Молоко овсяное',
+                'Кокосовое молоко',
+                'Сгущённое молоко',
+            ]
+        )
+
+
+class ReferenceDataCachingTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        reference_data_cache.clear()
+        self.guest_client = Client()
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+
+    def test_not_modified_without_changes(self):
+        """
+        Повторный запрос с ETag получает 304 за один запрос к БД — чтение
+        версии справочников.
+        """
+        response = self.guest_client.get('/api/tags/')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(
+                '/api/tags/', HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_etag_does_not_depend_on_process_cache(self):
+        """
+        ETag не меняется, пока не меняются данные, даже если кэши процесса
+        очищены (как в другом процессе или после перезапуска).
+        """
+        response = self.guest_client.get('/api/tags/')
+        cache.clear()
+        reference_data_cache.clear()
+        repeated_response = self.guest_client.get('/api/tags/')
+        self.assertEqual(repeated_response['ETag'], response['ETag'])
+        self.assertEqual(
+            repeated_response['Last-Modified'], response['Last-Modified']
+        )
+
+    def test_tag_change_invalidates_cache(self):
+        """Изменение тега меняет ETag и содержимое ответа."""
+        etag = self.guest_client.get('/api/tags/')['ETag']
+        Tag.objects.create(name='Обед', slug='lunch')
+        response = self.guest_client.get(
+            '/api/tags/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.json()), 2)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN для PostgreSQL')
+class QueryPlanTestCase(BaseRecipeTestCase):
+    """
+    Проверка, что основные запросы API выполняются по индексам. На малом
+    объёме тестовых данных планировщик предпочёл бы полный просмотр таблицы,
+    поэтому он отключается.
+    """
+
+    def setUp(self):
+        super().setUp()
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assert_uses_index(self, queryset, index_name=None):
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan)
+        if index_name:
+            self.assertIn(index_name, plan)
+
+    def test_recipe_list_uses_created_index(self):
+        self.assert_uses_index(
+            Recipe.objects.order_by('-created_at', '-id')[:10],
+            'ix_recipes_recipe_created'
+        )
+
+    def test_author_filter_uses_author_index(self):
+        self.assert_uses_index(
+            Recipe.objects.filter(
+                author=self.authors[0]
+            ).order_by('-created_at')[:10],
+            'ix_recipes_recipe_author'
+        )
+
+    def test_recipe_users_lookups_use_indexes(self):
+        recipe = create_recipes(
+            self.authors[0], 1, self.tags, self.ingredients
+        )[0]
+        for model in (Favorite, ShoppingCart):
+            with self.subTest(model=model.__name__):
+                self.assert_uses_index(
+                    model.objects.filter(
+                        recipe=recipe
+                    ).order_by().values('user_id')
+                )
+
+    def test_timeline_uses_feed_index(self):
+        reader = self.authors[0]
+        self.assert_uses_index(
+            get_timeline_feed(reader).order_by(*FEED_ORDERING)[:10],
+            'ix_recipes_feed_user_created'
+        )
+
+
+QUERY_BUDGET_SCENARIOS = {}
+READER_PASSWORD = 'Str0ng-password'
+
+
+def query_budget_scenario(viewset, action):
+    """
+    Регистрирует сценарий для проверки бюджета запросов действия. Сценарий
+    получает тест и объём данных, готовит данные и возвращает функцию,
+    выполняющую один запрос к действию.
+    """
+    def decorator(func):
+        QUERY_BUDGET_SCENARIOS[(viewset, action)] = func
+        return func
+    return decorator
+
+
+def create_sized_recipes(test, size, author=None):
+    """size рецептов с size тегами и ингредиентами."""
+    return create_recipes(
+        author or test.authors[0],
+        size,
+        test.tags[:size],
+        test.ingredients[:size],
+        prefix=f'Рецепт {size}'
+    )
+
+
+def get_recipe_data(test, size, name):
+    return {
+        'ingredients': [
+            {'id': ingredient.id, 'amount': 10}
+            for ingredient in test.ingredients[:size]
+        ],
+        'tags': [tag.id for tag in test.tags[:size]],
+        'image': IMAGE,
+        'name': name,
+        'text': 'Описание',
+        'cooking_time': 10,
+    }
+
+
+@query_budget_scenario(RecipeViewSet, 'list')
+def recipe_list(test, size):
+    create_sized_recipes(test, size)
+    return lambda: test.reader_client.get('/api/recipes/', {'limit': size})
+
+
+@query_budget_scenario(RecipeViewSet, 'retrieve')
+def recipe_retrieve(test, size):
+    recipe = create_sized_recipes(test, size)[0]
+    return lambda: test.reader_client.get(f'/api/recipes/{recipe.id}/')
+
+
+@query_budget_scenario(RecipeViewSet, 'create')
+def recipe_create(test, size):
+    return lambda: test.reader_client.post(
+        '/api/recipes/',
+        get_recipe_data(test, size, 'Новый рецепт'),
+        format='json'
+    )
+
+
+@query_budget_scenario(RecipeViewSet, 'partial_update')
+def recipe_partial_update(test, size):
+    # Изменяются количества всех size ингредиентов рецепта.
+    recipe = create_sized_recipes(test, size, test.reader)[0]
+    return lambda: test.reader_client.patch(
+        f'/api/recipes/{recipe.id}/',
+        get_recipe_data(test, size, 'Изменённый рецепт'),
+        format='json'
+    )
+
+
+@query_budget_scenario(RecipeViewSet, 'destroy')
+def recipe_destroy(test, size):
+    # Рецепт с size ингредиентами в избранном и корзинах size
+    # пользователей: связи удаляются каскадом.
+    recipe = create_sized_recipes(test, size, test.reader)[0]
+    for index in range(size):
+        user = User.objects.create(
+            username=f'user{index}', email=f'user{index}@example.com'
+        )
+        Favorite.objects.create(user=user, recipe=recipe)
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+    return lambda: test.reader_client.delete(f'/api/recipes/{recipe.id}/')
+
+
+@query_budget_scenario(RecipeViewSet, 'feed')
+def recipe_feed(test, size):
+    for author in test.authors[:size]:
+        create_sized_recipes(test, size, author)
+        Subscription.objects.create(user=test.reader, author=author)
+    return lambda: test.reader_client.get(
+        '/api/recipes/feed/', {'limit': size}
+    )
+
+
+@query_budget_scenario(RecipeViewSet, 'get_short_link')
+def recipe_get_short_link(test, size):
+    # Код выдаётся из заполненного пула, как в рабочем окружении.
+    recipe = create_sized_recipes(test, 1)[0]
+    call_command(
+        'fill_short_link_code_pool', '--count', '1', stdout=StringIO()
+    )
+    return lambda: test.reader_client.get(
+        f'/api/recipes/{recipe.id}/get-link/'
+    )
+
+
+def add_recipes_to(model, test, size):
+    """Добавляет size рецептов в избранное или корзину читателя."""
+    recipes = create_sized_recipes(test, size)
+    for recipe in recipes:
+        model.objects.create(user=test.reader, recipe=recipe)
+    return recipes
+
+
+@query_budget_scenario(RecipeViewSet, 'add_to_cart')
+def recipe_add_to_cart(test, size):
+    add_recipes_to(ShoppingCart, test, size)
+    recipe = create_recipes(test.authors[1], 1, test.tags, test.ingredients)[0]
+    return lambda: test.reader_client.post(
+        f'/api/recipes/{recipe.id}/shopping_cart/'
+    )
+
+
+@query_budget_scenario(RecipeViewSet, 'remove_from_cart')
+def recipe_remove_from_cart(test, size):
+    recipe = add_recipes_to(ShoppingCart, test, size)[0]
+    return lambda: test.reader_client.delete(
+        f'/api/recipes/{recipe.id}/shopping_cart/'
+    )
+
+
+@query_budget_scenario(RecipeViewSet, 'add_to_favorite')
+def recipe_add_to_favorite(test, size):
+    add_recipes_to(Favorite, test, size)
+    recipe = create_recipes(test.authors[1], 1, test.tags, test.ingredients)[0]
+    return lambda: test.reader_client.post(
+        f'/api/recipes/{recipe.id}/favorite/'
+    )
+
+
+@query_budget_scenario(RecipeViewSet, 'remove_from_favorite')
+def recipe_remove_from_favorite(test, size):
+    recipe = add_recipes_to(Favorite, test, size)[0]
+    return lambda: test.reader_client.delete(
+        f'/api/recipes/{recipe.id}/favorite/'
+    )
+
+
+@query_budget_scenario(RecipeViewSet, 'download_shopping_cart')
+def recipe_download_shopping_cart(test, size):
+    add_recipes_to(ShoppingCart, test, size)
+    return lambda: test.reader_client.get(
+        '/api/recipes/download_shopping_cart/?format=csv'
+    )
+
+
+@query_budget_scenario(RecipeViewSet, 'create_shopping_cart_job')
+def recipe_create_shopping_cart_job(test, size):
+    add_recipes_to(ShoppingCart, test, size)
+    return lambda: test.reader_client.post(
+        '/api/recipes/download_shopping_cart/jobs/'
+    )
+
+
+@query_budget_scenario(RecipeViewSet, 'get_shopping_cart_job')
+def recipe_get_shopping_cart_job(test, size):
+    add_recipes_to(ShoppingCart, test, size)
+    job = ShoppingListJob.objects.create(user=test.reader)
+    return lambda: test.reader_client.get(
+        f'/api/recipes/download_shopping_cart/jobs/{job.id}/'
+    )
+
+
+@query_budget_scenario(UserViewSet, 'list')
+def user_list(test, size):
+    User.objects.bulk_create(
+        User(username=f'user{index}', email=f'user{index}@example.com')
+        for index in range(size)
+    )
+    return lambda: test.reader_client.get('/api/users/', {'limit': size})
+
+
+@query_budget_scenario(UserViewSet, 'retrieve')
+def user_retrieve(test, size):
+    author = test.authors[0]
+    Subscription.objects.create(user=test.reader, author=author)
+    return lambda: test.reader_client.get(f'/api/users/{author.id}/')
+
+
+@query_budget_scenario(UserViewSet, 'create')
+def user_create(test, size):
+    return lambda: test.guest_client.post(
+        '/api/users/',
+        {
+            'email': 'new@example.com',
+            'username': 'new',
+            'first_name': 'Имя',
+            'last_name': 'Фамилия',
+            'password': 'Str0ng-password',
+        }
+    )
+
+
+@query_budget_scenario(UserViewSet, 'me')
+def user_me(test, size):
+    return lambda: test.reader_client.get('/api/users/me/')
+
+
+@query_budget_scenario(UserViewSet, 'set_password')
+def user_set_password(test, size):
+    return lambda: test.reader_client.post(
+        '/api/users/set_password/',
+        {
+            'current_password': READER_PASSWORD,
+            'new_password': 'N3w-password',
+        }
+    )
+
+
+@query_budget_scenario(UserViewSet, 'update_avatar')
+def user_update_avatar(test, size):
+    return lambda: test.reader_client.put(
+        '/api/users/me/avatar/', {'avatar': IMAGE}, format='json'
+    )
+
+
+@query_budget_scenario(UserViewSet, 'delete_avatar')
+def user_delete_avatar(test, size):
+    return lambda: test.reader_client.delete('/api/users/me/avatar/')
+
+
+@query_budget_scenario(UserViewSet, 'add_subscription')
+def user_add_subscription(test, size):
+    author = test.authors[0]
+    create_sized_recipes(test, size, author)
+    return lambda: test.reader_client.post(
+        f'/api/users/{author.id}/subscribe/?recipes_limit={size}'
+    )
+
+
+@query_budget_scenario(UserViewSet, 'remove_subscription')
+def user_remove_subscription(test, size):
+    author = test.authors[0]
+    Subscription.objects.create(user=test.reader, author=author)
+    return lambda: test.reader_client.delete(
+        f'/api/users/{author.id}/subscribe/'
+    )
+
+
+@query_budget_scenario(UserViewSet, 'get_subscriptions')
+def user_get_subscriptions(test, size):
+    for author in test.authors[:size]:
+        create_sized_recipes(test, size, author)
+        Subscription.objects.create(user=test.reader, author=author)
+    return lambda: test.reader_client.get(
+        '/api/users/subscriptions/', {'limit': size, 'recipes_limit': size}
+    )
+
+
+@query_budget_scenario(TagViewSet, 'list')
+def tag_list(test, size):
+    Tag.objects.bulk_create(
+        Tag(name=f'Новый тег {index}', slug=f'new-tag-{index}')
+        for index in range(size)
+    )
+    return lambda: test.guest_client.get('/api/tags/')
+
+
+@query_budget_scenario(TagViewSet, 'retrieve')
+def tag_retrieve(test, size):
+    return lambda: test.guest_client.get(f'/api/tags/{test.tags[0].id}/')
+
+
+@query_budget_scenario(IngredientViewSet, 'list')
+def ingredient_list(test, size):
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'Новый ингредиент {index}', measurement_unit='г')
+        for index in range(size)
+    )
+    return lambda: test.guest_client.get('/api/ingredients/')
+
+
+@query_budget_scenario(IngredientViewSet, 'retrieve')
+def ingredient_retrieve(test, size):
+    return lambda: test.guest_client.get(
+        f'/api/ingredients/{test.ingredients[0].id}/'
+    )
+
+
+@override_settings(
+    PASSWORD_HASHERS=('django.contrib.auth.hashers.MD5PasswordHasher',)
+)
+class QueryBudgetTestCase(TemporaryMediaMixin, BaseRecipeTestCase):
+    # Объёмы данных, на которых выполняется каждое действие.
+    SIZES = (1, 3)
+
+    def setUp(self):
+        super().setUp()
+        self.guest_client = APIClient()
+        self.reader = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            password=READER_PASSWORD
+        )
+        self.reader_client = APIClient()
+        token = Token.objects.create(user=self.reader)
+        self.reader_client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+    def count_queries(self, scenario, size):
+        """
+        Число запросов действия на данных объёма size вместе с функциями
+        on_commit, которые выполнились бы при фиксации транзакции.
+        """
+        cache.clear()
+        for lru_cache in registered_caches.values():
+            lru_cache.clear()
+        request = scenario(self, size)
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = request()
+                if response.streaming:
+                    b''.join(response.streaming_content)
+        self.assertLess(
+            response.status_code,
+            HTTPStatus.BAD_REQUEST,
+            getattr(response, 'data', None)
+        )
+        return len(context)
+
+    def test_every_action_has_budget_and_scenario(self):
+        """Для каждого маршрута API задан бюджет и сценарий проверки."""
+        for pattern in router.urls:
+            viewset = getattr(pattern.callback, 'cls', None)
+            if viewset not in QUERY_BUDGETS:
+                continue
+            for method, action in pattern.callback.actions.items():
+                if (
+                    method not in viewset.http_method_names
+                    or action in UNBUDGETED_ACTIONS.get(viewset, ())
+                ):
+                    continue
+                with self.subTest(viewset=viewset.__name__, action=action):
+                    self.assertIn(action, QUERY_BUDGETS[viewset])
+                    self.assertIn((viewset, action), QUERY_BUDGET_SCENARIOS)
+
+    def test_query_budgets(self):
+        """
+        Число запросов каждого действия не зависит от объёма данных и не
+        превышает бюджет.
+        """
+        for viewset, budgets in QUERY_BUDGETS.items():
+            for action, budget in budgets.items():
+                scenario = QUERY_BUDGET_SCENARIOS[(viewset, action)]
+                with self.subTest(viewset=viewset.__name__, action=action):
+                    counts = []
+                    for size in self.SIZES:
+                        with transaction.atomic():
+                            counts.append(self.count_queries(scenario, size))
+                            transaction.set_rollback(True)
+                    self.assertEqual(
+                        len(set(counts)), 1, 'Число запросов растёт с данными'
+                    )
+                    self.assertLessEqual(counts[0], budget)
+
+
+@override_settings(
+    PASSWORD_HASHERS=('django.contrib.auth.hashers.MD5PasswordHasher',)
+)
+class CachedTokenAuthenticationTestCase(TestCase):
+
+    def setUp(self):
+        auth_token_cache.clear()
+        auth_token_user_keys.clear()
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def get_me(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/users/me/')
+        token_queries = [
+            query for query in context.captured_queries
+            if 'authtoken_token' in query['sql']
+        ]
+        return response, len(token_queries)
+
+    def test_token_query_is_cached(self):
+        """Токен с пользователем запрашивается только при промахе кэша."""
+        for expected_queries in (1, 0):
+            response, token_queries = self.get_me()
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            self.assertEqual(token_queries, expected_queries)
+
+    def test_user_change_invalidates_cache(self):
+        """Изменённый пользователь сразу виден в ответах."""
+        self.get_me()
+        self.user.first_name = 'Новое имя'
+        self.user.save()
+        response, token_queries = self.get_me()
+        self.assertEqual(response.data['first_name'], 'Новое имя')
+        self.assertEqual(token_queries, 1)
+
+    def test_user_change_through_api_invalidates_cache(self):
+        self.get_me()
+        response = self.client.post(
+            '/api/users/set_password/',
+            {'current_password': 'password', 'new_password': 'N3w-password'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        _, token_queries = self.get_me()
+        self.assertEqual(token_queries, 1)
+
+    def test_deactivated_user_is_rejected(self):
+        self.get_me()
+        self.user.is_active = False
+        self.user.save()
+        response, _ = self.get_me()
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_logout_invalidates_cache(self):
+        self.get_me()
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        response, _ = self.get_me()
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_counter_change_invalidates_cache(self):
+        """
+        Счётчики меняются через update() без сохранения пользователя, но
+        закэшированный пользователь всё равно сбрасывается.
+        """
+        author = User.objects.create(
+            username='author', email='author@example.com'
+        )
+        self.get_me()
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.objects.create(user=self.user, author=author)
+        _, token_queries = self.get_me()
+        self.assertEqual(token_queries, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipes(self.user, 1, (), ())
+        _, token_queries = self.get_me()
+        self.assertEqual(token_queries, 1)
+
+    @mock.patch('recipes.feed.FEED_TIMELINE_MIN_SUBSCRIPTIONS', 2)
+    def test_feed_after_unsubscribe_below_threshold(self):
+        """
+        После отписки ниже порога лента собирается при чтении, хотя
+        пользователь из кэша ещё видел материализованную ленту.
+        """
+        authors = [
+            User.objects.create(
+                username=f'author{index}', email=f'author{index}@example.com'
+            )
+            for index in range(2)
+        ]
+        recipes = [
+            create_recipes(author, 1, (), ())[0] for author in authors
+        ]
+        for author in authors:
+            Subscription.objects.create(user=self.user, author=author)
+        response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(len(response.json()['results']), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(
+                f'/api/users/{authors[1].id}/subscribe/'
+            )
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+        response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['results']],
+            [recipes[0].id]
+        )
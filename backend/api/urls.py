@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 
 from users.views import UserViewSet
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet, cache_stats
 
 app_name = 'api'
 router = DefaultRouter()
@@ -16,4 +16,5 @@ router.register('users', UserViewSet, basename='users')
 urlpatterns = (
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path('cache-stats/', cache_stats, name='cache-stats'),
 )
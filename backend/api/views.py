@@ -1,38 +1,43 @@
 from io import BytesIO
 
-from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import FileResponse
+from django.db.models import Exists, OuterRef, Prefetch, Value
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django_filters.rest_framework import DjangoFilterBackend
-from reportlab.lib import enums, pagesizes, styles
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.platypus import (
-    ListFlowable,
-    ListItem,
-    Paragraph,
-    SimpleDocTemplate
-)
 from rest_framework import status, viewsets
-from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.permissions import (
+    IsAdminUser,
+    IsAuthenticated,
+    IsAuthenticatedOrReadOnly
+)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from recipes.feed import get_feed
 from recipes.models import (
     Favorite,
     Ingredient,
     Recipe,
     RecipeIngredient,
     ShoppingCart,
+    ShoppingListJob,
     Tag
 )
-from recipes.utils import generate_unique_short_link_code
+from recipes.utils import assign_short_link_code, get_reference_data_version
+from users.models import Subscription
 
-from .filters import IngredientFilter, RecipeFilter
+from . import shopping_list
+from .cache import reference_data_cache, registered_caches, short_link_cache
+from .filters import IngredientSearchFilter, RecipeFilter
+from .negotiation import FormatParamContentNegotiation
+from .pagination import FeedCursorPagination, RecipePagination
 from .permissions import IsAuthorOrReadOnly
+from .renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
 from .serializers import (
     FavoriteSerializer,
     IngredientSerializer,
@@ -40,24 +45,68 @@ from .serializers import (
     RecipeShortReadSerializer,
     RecipeWriteSerializer,
     ShoppingCartSerializer,
+    ShoppingListJobSerializer,
     TagSerializer
 )
 
 User = get_user_model()
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+def get_request_reference_data_version(request):
+    """
+    Версия справочников, прочитанная один раз за запрос: её используют и
+    ETag, и Last-Modified, и ключ кэша списка.
+    """
+    if not hasattr(request, '_reference_data_version'):
+        request._reference_data_version = get_reference_data_version()
+    return request._reference_data_version
+
+
+def reference_data_etag(request, *args, **kwargs):
+    return f'"{get_request_reference_data_version(request)[0]}"'
+
+
+def reference_data_last_modified(request, *args, **kwargs):
+    return get_request_reference_data_version(request)[1]
+
+
+reference_data_condition = condition(
+    etag_func=reference_data_etag,
+    last_modified_func=reference_data_last_modified
+)
+
+
+@method_decorator(reference_data_condition, name='list')
+@method_decorator(reference_data_condition, name='retrieve')
+class ReferenceDataViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Базовый вьюсет справочников. Ответы снабжаются ETag и Last-Modified по
+    версии справочников (клиент получает 304, если данные не менялись), а
+    сериализованный список кэшируется в процессе до изменения версии.
+    """
+    pagination_class = None
+
+    def list(self, request, *args, **kwargs):  # noqa: A003
+        key = (
+            get_request_reference_data_version(request)[0],
+            request.get_full_path()
+        )
+        data = reference_data_cache.get(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            reference_data_cache.set(key, data)
+        return Response(data)
+
+
+class TagViewSet(ReferenceDataViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
-    pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReferenceDataViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    pagination_class = None
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
+    filter_backends = (IngredientSearchFilter,)
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
@@ -68,9 +117,69 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    pagination_class = RecipePagination
+
+    def get_queryset(self):
+        queryset = self.queryset
+        if self.action == 'feed':
+            queryset = get_feed(self.request.user)
+        if self.action in ('list', 'retrieve', 'feed'):
+            queryset = self.get_read_queryset(queryset)
+        # Признаки избранного, корзины и подписки на автора вычисляются
+        # подзапросами EXISTS в основном запросе, чтобы сериализаторы не
+        # обращались к БД для каждого рецепта.
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                is_author_subscribed=Value(False)
+            )
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_author_subscribed=Exists(
+                Subscription.objects.filter(
+                    user=user, author=OuterRef('author')
+                )
+            )
+        )
+
+    @staticmethod
+    def get_read_queryset(queryset):
+        """
+        Добавляет к запросу рецептов жадную загрузку всего, что выводит
+        RecipeReadSerializer: автора, тегов и ингредиентов.
+        """
+        return queryset.select_related('author').prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.all()),
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ).order_by('ingredient__name')
+            )
+        )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        # Ошибки выгрузки списка покупок отдаются в JSON, а не в формате
+        # запрошенного документа.
+        if self.action == 'download_shopping_cart' and getattr(
+            response, 'exception', False
+        ):
+            response.accepted_renderer = JSONRenderer()
+            response.accepted_media_type = JSONRenderer.media_type
+        return response
 
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'feed'):
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
@@ -99,12 +208,23 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
+    @action(
+        ('get',),
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedCursorPagination
+    )
+    def feed(self, request):
+        # Лента рецептов авторов из подписок, от новых к старым; курсорная
+        # пагинация по полям ленты (recipes.feed) не зависит от глубины
+        # страницы.
+        return self.list(request)
+
     @action(('get',), detail=True, url_path='get-link')
     def get_short_link(self, request, pk):
         recipe = self.get_object()
         if not recipe.short_link_code:
-            recipe.short_link_code = generate_unique_short_link_code()
-            recipe.save(update_fields=('short_link_code',))
+            assign_short_link_code(recipe)
         return Response({
             'short-link': request.build_absolute_uri(
                 f'/s/{recipe.short_link_code}'
@@ -129,65 +249,78 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def remove_from_favorite(self, request, pk):
         return self.remove_from(request, pk, Favorite)
 
-    @action(('get',), detail=False, url_path='download_shopping_cart')
+    @action(
+        ('get',),
+        detail=False,
+        url_path='download_shopping_cart',
+        permission_classes=(IsAuthenticated,),
+        # Формат выбирается только параметром ?format=pdf|txt|csv|json, по
+        # умолчанию отдаётся PDF независимо от заголовка Accept.
+        renderer_classes=(
+            PDFRenderer, PlainTextRenderer, CSVRenderer, JSONRenderer
+        ),
+        content_negotiation_class=FormatParamContentNegotiation
+    )
     def download_shopping_cart(self, request):
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=pagesizes.letter)
-        # Регистрация шрифта.
-        pdfmetrics.registerFont(
-            TTFont(
-                'OpenSans',
-                settings.BASE_DIR / 'fonts/OpenSans-Regular.ttf'
+        file_format = request.accepted_renderer.format
+        document = shopping_list.get_document(request.user, file_format)
+        if file_format == 'pdf':
+            return FileResponse(
+                BytesIO(document),
+                as_attachment=True,
+                filename='shopping_cart.pdf'
+            )
+        response = StreamingHttpResponse(
+            document,
+            content_type=(
+                f'{request.accepted_renderer.media_type}; charset=utf-8'
             )
         )
-        # Создание стилей для заголовка и текста.
-        header_style = styles.ParagraphStyle(
-            'HeaderStyle',
-            fontName='OpenSans',
-            fontSize=14,
-            alignment=enums.TA_CENTER,
-            spaceAfter=25
-        )
-        regular_style = styles.ParagraphStyle(
-            'RegularStyle',
-            fontName='OpenSans',
-            fontSize=12,
-            spaceAfter=10
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{file_format}"'
         )
-        # Запрос списка покупок пользователя.
-        ingredients_summary = (
-            RecipeIngredient.objects.filter(
-                recipe__shoppingcart_users__user=request.user
-            ).values(
-                'ingredient__name', 'ingredient__measurement_unit'
-            ).annotate(
-                total_amount=Sum('amount')
-            ).order_by(
-                'ingredient__name'
-            )
+        return response
+
+    @action(
+        ('post',),
+        detail=False,
+        url_path='download_shopping_cart/jobs',
+        permission_classes=(IsAuthenticated,)
+    )
+    def create_shopping_cart_job(self, request):
+        """
+        Ставит формирование PDF в очередь. Задание выполняет команда
+        process_shopping_list_jobs, результат забирается по id задания.
+        """
+        job = ShoppingListJob.objects.create(user=request.user)
+        return Response(
+            ShoppingListJobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED
         )
-        # Формирование заголовка и списка ингредиентов с буллетами.
-        header = Paragraph('Список покупок', header_style)
-        bullet_points = ListFlowable(
-            [
-                ListItem(
-                    Paragraph(
-                        f'{item["ingredient__name"]} — {item["total_amount"]} '
-                        f'{item["ingredient__measurement_unit"]}',
-                        regular_style
-                    )
-                )
-                for item in ingredients_summary
-            ],
-            bulletType='bullet'
+
+    @action(
+        ('get',),
+        detail=False,
+        url_path=r'download_shopping_cart/jobs/(?P<job_id>\d+)',
+        permission_classes=(IsAuthenticated,)
+    )
+    def get_shopping_cart_job(self, request, job_id):
+        job = get_object_or_404(
+            ShoppingListJob, id=job_id, user=request.user
         )
-        # Генерация и возврат PDF.
-        doc.build([header, bullet_points])
-        buffer.seek(0)
-        return FileResponse(
-            buffer,
-            as_attachment=True,
-            filename='shopping_cart.pdf'
+        if job.status == ShoppingListJob.Status.DONE:
+            return FileResponse(
+                job.file.open('rb'),
+                as_attachment=True,
+                filename='shopping_cart.pdf'
+            )
+        return Response(
+            ShoppingListJobSerializer(job).data,
+            status=(
+                status.HTTP_200_OK
+                if job.status == ShoppingListJob.Status.FAILED
+                else status.HTTP_202_ACCEPTED
+            )
         )
 
 
@@ -199,11 +332,24 @@ def redirect_to_recipe_detail(request, code):
     email-рассылках, социальных сетях или других местах. После перехода по
     такой ссылке в юай происходит перенаправление на стандартный эндпоинт
     детального описания рецепта.
+    Адреса перенаправления кэшируются в процессе, поэтому повторные переходы
+    по ссылке обходятся без запросов к БД.
     """
-    recipe = get_object_or_404(Recipe, short_link_code=code)
-    return redirect(
-        reverse(
+    url = short_link_cache.get(code)
+    if url is None:
+        recipe = get_object_or_404(Recipe, short_link_code=code)
+        url = reverse(
             'api:recipes-detail',
             kwargs={'pk': recipe.id}
         ).replace('/api', '')
-    )
+        short_link_cache.set(code, url)
+    return redirect(url)
+
+
+@api_view(('GET',))
+@permission_classes((IsAdminUser,))
+def cache_stats(request):
+    """Статистика кэшей процесса для мониторинга."""
+    return Response({
+        name: cache.stats() for name, cache in registered_caches.items()
+    })
@@ -1,7 +1,11 @@
 INGREDIENT_NAME_MAX_LENGTH = 128
 INGREDIENT_MEASUREMENT_UNIT_MAX_LENGTH = 64
 RECIPE_NAME_MAX_LENGTH = 256
+RECIPE_SHORT_LINK_CODE_MIN_LENGTH = 3
 RECIPE_SHORT_LINK_CODE_MAX_LENGTH = 3
+SHORT_LINK_CODE_POOL_FILL_SIZE = 1000
+SHORT_LINK_CACHE_MAX_SIZE = 10000
+SHORT_LINK_CACHE_TIMEOUT = 60 * 5
 RECIPE_COOKING_TIME_MIN_VALUE = 1
 RECIPE_INGREDIENT_AMOUNT_MIN_VALUE = 1
 TAG_NAME_MAX_LENGTH = 32
@@ -9,3 +13,14 @@ TAG_SLUG_MAX_LENGTH = 32
 OBJECT_NAME_MAX_DISPLAY_LENGTH = 64
 PARAM_RECIPES_LIMIT_MIN_VALUE = 1
 PAGINATION_PAGE_SIZE = 10
+SHOPPING_LIST_JOB_STATUS_MAX_LENGTH = 16
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60 * 24
+SHOPPING_LIST_JOB_TIMEOUT = 60 * 10
+SHOPPING_LIST_JOB_RETENTION = 60 * 60 * 24
+INGREDIENT_SEARCH_RESULTS_LIMIT = 50
+INGREDIENT_SEARCH_INDEX_TIMEOUT = 60 * 10
+REFERENCE_DATA_CACHE_MAX_SIZE = 1000
+REFERENCE_DATA_CACHE_TIMEOUT = 60 * 5
+FEED_TIMELINE_MIN_SUBSCRIPTIONS = 50
+AUTH_TOKEN_CACHE_MAX_SIZE = 10000
+AUTH_TOKEN_CACHE_TIMEOUT = 60
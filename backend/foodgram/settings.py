@@ -32,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -112,13 +113,24 @@ STATIC_ROOT = BASE_DIR / 'static/static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media/'
 
+# Версии корзин и справочников хранятся в кэше, поэтому при нескольких
+# процессах gunicorn нужен общий бэкенд (например, FileBasedCache).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.PageNumberPagination'
 }
@@ -137,19 +149,35 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
-if DEBUG:
-    LOGGING = {
-        'version': 1,
-        'disable_existing_loggers': False,
-        'handlers': {
-            'console': {
-                'class': 'logging.StreamHandler',
-            },
+# Доля запросов, для которых QueryInstrumentationMiddleware считает запросы
+# к БД, и число повторов одинакового SQL, при котором строка журнала
+# записывается с уровнем WARNING. Без переменной окружения замеры
+# выключены, в том числе в тестах.
+QUERY_INSTRUMENTATION_SAMPLE_RATE = float(
+    os.getenv('QUERY_INSTRUMENTATION_SAMPLE_RATE', '0')
+)
+QUERY_INSTRUMENTATION_REPEATED_THRESHOLD = int(
+    os.getenv('QUERY_INSTRUMENTATION_REPEATED_THRESHOLD', '5')
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
         },
-        'loggers': {
-            'django.db.backends': {
-                'handlers': ['console'],
-                'level': 'DEBUG',
-            },
+    },
+    'loggers': {
+        'api.queries': {
+            'handlers': ['console'],
+            'level': 'INFO',
         },
+    },
+}
+
+if DEBUG:
+    LOGGING['loggers']['django.db.backends'] = {
+        'handlers': ['console'],
+        'level': 'DEBUG',
     }
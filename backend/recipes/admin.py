@@ -9,6 +9,7 @@ from .models import (
     Recipe,
     RecipeIngredient,
     ShoppingCart,
+    ShoppingListJob,
     Tag
 )
 
@@ -41,9 +42,11 @@ class RecipeAdmin(admin.ModelAdmin):
         'author_link',
         'cooking_time',
         'ingredients_list',
-        'favorites_count'
+        'favorites_count',
+        'shopping_carts_count'
     )
     list_display_links = ('image_preview', 'name')
+    list_select_related = ('author',)
     search_fields = (
         'name',
         'author__username',
@@ -52,11 +55,21 @@ class RecipeAdmin(admin.ModelAdmin):
         'author__email'
     )
     list_filter = ('tags',)
-    readonly_fields = ('author', 'short_link_code', 'created_at')
+    readonly_fields = (
+        'author',
+        'short_link_code',
+        'created_at',
+        'favorites_count',
+        'shopping_carts_count'
+    )
     filter_horizontal = ('tags',)
     inlines = (RecipeIngredientInline,)
     ordering = ('-created_at',)
 
+    def get_queryset(self, request):
+        # Ингредиенты всех рецептов страницы загружаются одним запросом.
+        return super().get_queryset(request).prefetch_related('ingredients')
+
     @admin.display(description='Изображение')
     def image_preview(self, obj):
         return format_html(
@@ -72,10 +85,6 @@ class RecipeAdmin(admin.ModelAdmin):
             obj.author = request.user
         super().save_model(request, obj, form, change)
 
-    @admin.display(description='В избранном')
-    def favorites_count(self, obj):
-        return obj.favorite_users.count()
-
     @admin.display(description='Автор')
     def author_link(self, obj):
         url = reverse(
@@ -107,12 +116,14 @@ class TagAdmin(admin.ModelAdmin):
 @admin.register(RecipeIngredient)
 class RecipeIngredientAdmin(admin.ModelAdmin):
     list_display = ('recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe', 'ingredient')
     search_fields = ('recipe__name', 'ingredient__name')
     ordering = ('recipe__name', 'ingredient__name')
 
 
 class BaseUserRecipeAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
     ordering = ('user__username', 'recipe__name')
 
@@ -125,3 +136,15 @@ class FavoriteAdmin(BaseUserRecipeAdmin):
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(BaseUserRecipeAdmin):
     pass
+
+
+@admin.register(ShoppingListJob)
+class ShoppingListJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'user', 'status', 'created_at', 'started_at', 'finished_at'
+    )
+    list_select_related = ('user',)
+    list_filter = ('status',)
+    search_fields = ('user__username',)
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
+    ordering = ('-created_at',)
@@ -0,0 +1,184 @@
+"""
+Лента рецептов авторов, на которых подписан пользователь.
+
+Для большинства пользователей лента собирается при чтении: рецепты
+выбираются по списку авторов из подписок. Когда число подписок достигает
+FEED_TIMELINE_MIN_SUBSCRIPTIONS, лента материализуется в таблице FeedEntry и
+у пользователя устанавливается has_feed_timeline: записи добавляются при
+публикации рецепта и при подписке, удаляются при отписке. Когда подписок
+становится меньше порога, записи удаляются вместе с флагом. Выбор способа
+чтения определяется флагом, а не счётчиком, поэтому расхождение счётчика с
+данными не приводит к чтению неполной ленты; recompute_counters
+согласует флаги и ленты с пересчитанными счётчиками.
+
+Обе ленты аннотированы полями feed_created_at и feed_recipe_id, по которым
+они упорядочиваются и разбиваются на страницы (FEED_ORDERING).
+Материализованная лента берёт их из записи FeedEntry, и страница
+выбирается по индексу (user, -created_at, -recipe) без сортировки
+рецептов; значения совпадают с created_at и id рецепта, поэтому курсор
+остаётся верным при смене способа чтения.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import F
+
+from foodgram.constants import FEED_TIMELINE_MIN_SUBSCRIPTIONS
+from users.models import Subscription
+
+from .models import FeedEntry, Recipe
+
+User = get_user_model()
+
+FEED_ENTRIES_BATCH_SIZE = 1000
+FEED_ORDERING = ('-feed_created_at', '-feed_recipe_id')
+
+
+def uses_timeline(subscriptions_count):
+    return subscriptions_count >= FEED_TIMELINE_MIN_SUBSCRIPTIONS
+
+
+def get_fan_out_feed(user):
+    return Recipe.objects.filter(
+        author__in=Subscription.objects.filter(user=user).values('author')
+    ).annotate(feed_created_at=F('created_at'), feed_recipe_id=F('id'))
+
+
+def get_timeline_feed(user):
+    # F() использует соединение с записями ленты из filter().
+    return Recipe.objects.filter(feedentry_users__user=user).annotate(
+        feed_created_at=F('feedentry_users__created_at'),
+        feed_recipe_id=F('feedentry_users__recipe')
+    )
+
+
+def get_feed(user):
+    # Флаг читается из БД: объект пользователя может быть взят из кэша
+    # аутентификации и не отражать последних подписок.
+    if User.objects.filter(
+        id=user.id, has_feed_timeline=True
+    ).exists():
+        return get_timeline_feed(user)
+    return get_fan_out_feed(user)
+
+
+def add_recipe_to_timelines(recipe):
+    """Добавляет новый рецепт в материализованные ленты подписчиков."""
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id, recipe=recipe, created_at=recipe.created_at
+            )
+            for user_id in Subscription.objects.filter(
+                author=recipe.author_id,
+                user__has_feed_timeline=True
+            ).values_list('user_id', flat=True)
+        ),
+        batch_size=FEED_ENTRIES_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def add_recipes_to_timeline(user_id, recipes):
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id, recipe_id=recipe_id, created_at=created_at
+            )
+            for recipe_id, created_at in recipes.values_list(
+                'id', 'created_at'
+            )
+        ),
+        batch_size=FEED_ENTRIES_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def rebuild_timeline(user_id):
+    """
+    Заполняет материализованную ленту пользователя заново и отмечает, что
+    лента читается из FeedEntry.
+    """
+    FeedEntry.objects.filter(user=user_id).delete()
+    add_recipes_to_timeline(
+        user_id,
+        Recipe.objects.filter(
+            author__in=Subscription.objects.filter(
+                user=user_id
+            ).values('author')
+        )
+    )
+    User.objects.filter(id=user_id).update(has_feed_timeline=True)
+
+
+def drop_timelines(user_ids):
+    """Возвращает пользователей к сборке ленты при чтении."""
+    User.objects.filter(id__in=user_ids).update(has_feed_timeline=False)
+    FeedEntry.objects.filter(user__in=user_ids).delete()
+
+
+def drop_short_timelines(user_ids):
+    """
+    Удаляет ленты пользователей из user_ids (может быть запросом), число
+    подписок которых опустилось ниже порога.
+    """
+    drop_timelines(
+        list(
+            User.objects.filter(
+                id__in=user_ids,
+                has_feed_timeline=True,
+                subscriptions_count__lt=FEED_TIMELINE_MIN_SUBSCRIPTIONS
+            ).values_list('id', flat=True)
+        )
+    )
+
+
+def sync_timelines():
+    """
+    Согласует материализованные ленты со счётчиками подписок: ленты
+    пользователей не ниже порога строятся заново, ленты остальных
+    удаляются. Возвращает число перестроенных и удалённых лент.
+    """
+    user_ids = list(
+        User.objects.filter(
+            subscriptions_count__gte=FEED_TIMELINE_MIN_SUBSCRIPTIONS
+        ).values_list('id', flat=True)
+    )
+    for user_id in user_ids:
+        rebuild_timeline(user_id)
+    dropped_ids = list(
+        User.objects.filter(
+            has_feed_timeline=True,
+            subscriptions_count__lt=FEED_TIMELINE_MIN_SUBSCRIPTIONS
+        ).values_list('id', flat=True)
+    )
+    drop_timelines(dropped_ids)
+    return len(user_ids), len(dropped_ids)
+
+
+def update_timeline(subscription, delta):
+    """
+    Поддерживает материализованную ленту при подписке (delta=1) и отписке
+    (delta=-1). Вызывается после обновления счётчика подписок.
+    """
+    state = User.objects.filter(
+        id=subscription.user_id
+    ).values_list('subscriptions_count', 'has_feed_timeline').first()
+    if state is None:
+        return
+    subscriptions_count, has_feed_timeline = state
+    if not has_feed_timeline:
+        if uses_timeline(subscriptions_count):
+            rebuild_timeline(subscription.user_id)
+    elif not uses_timeline(subscriptions_count):
+        # Пользователь опустился ниже порога: лента снова собирается при
+        # чтении, материализованные записи больше не нужны.
+        drop_timelines((subscription.user_id,))
+    elif delta > 0:
+        add_recipes_to_timeline(
+            subscription.user_id,
+            Recipe.objects.filter(author=subscription.author_id)
+        )
+    else:
+        FeedEntry.objects.filter(
+            user=subscription.user_id,
+            recipe__author=subscription.author_id
+        ).delete()
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from foodgram.constants import SHORT_LINK_CODE_POOL_FILL_SIZE
+from recipes.models import ShortLinkCode
+from recipes.utils import fill_short_link_code_pool
+
+
+class Command(BaseCommand):
+    help = (  # noqa: A003
+        'Пополняет пул свободных кодов коротких ссылок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=SHORT_LINK_CODE_POOL_FILL_SIZE,
+            help='Количество добавляемых кодов.'
+        )
+        parser.add_argument(
+            '--top-up',
+            action='store_true',
+            help=(
+                'Дополнить пул до --count кодов вместо добавления --count '
+                'новых. Используется при деплое, чтобы повторные запуски '
+                'не раздували пул.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        count = options['count']
+        if options['top_up']:
+            count -= ShortLinkCode.objects.count()
+        added = fill_short_link_code_pool(count) if count > 0 else 0
+        self.stdout.write(f'Добавлено кодов: {added}')
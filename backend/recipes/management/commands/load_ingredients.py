@@ -0,0 +1,175 @@
+import csv
+import json
+import time
+from io import StringIO
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes.models import Ingredient
+from recipes.utils import bump_reference_data_version
+
+DEFAULT_PATH = settings.BASE_DIR.parent / 'data/ingredients.csv'
+FORMATS = ('csv', 'json')
+BATCH_SIZE = 1000
+JSON_READ_SIZE = 64 * 1024
+# Ограничение уникальности Ingredient, по которому COPY пропускает
+# существующие строки.
+INGREDIENT_UNIQUE_CONSTRAINT = 'uq_recipes_ingredient_name_measurement_unit'
+
+
+def read_csv(file):
+    """Строки CSV без заголовка: название, единица измерения."""
+    for row in csv.reader(file):
+        if row:
+            name, measurement_unit = row
+            yield name, measurement_unit
+
+
+def read_json(file):
+    """
+    Разбирает JSON-массив объектов {"name", "measurement_unit"} по частям,
+    не загружая файл в память целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n[,':
+            position += 1
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                if position >= len(buffer):
+                    return
+                raise
+            chunk = file.read(JSON_READ_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item['name'], item['measurement_unit']
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+class CopyStream:
+    """Файлоподобный объект для COPY FROM STDIN: отдаёт строки в CSV."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.count = 0
+
+    def read(self, size=-1):
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        for row in self.rows:
+            writer.writerow(row)
+            self.count += 1
+            if 0 < size <= buffer.tell():
+                break
+        return buffer.getvalue()
+
+
+def load_with_copy(rows):
+    """
+    Загружает строки через COPY во временную таблицу и переносит их в
+    таблицу ингредиентов одним INSERT ... ON CONFLICT DO NOTHING.
+    Возвращает количество прочитанных и добавленных строк.
+    """
+    table = connection.ops.quote_name(Ingredient._meta.db_table)
+    constraint = connection.ops.quote_name(INGREDIENT_UNIQUE_CONSTRAINT)
+    stream = CopyStream(rows)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE ingredients_staging '
+            '(name text, measurement_unit text) ON COMMIT DROP'
+        )
+        cursor.cursor.copy_expert(
+            'COPY ingredients_staging (name, measurement_unit) '
+            'FROM STDIN WITH (FORMAT csv)',
+            stream
+        )
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            'SELECT name, measurement_unit FROM ingredients_staging '
+            f'ON CONFLICT ON CONSTRAINT {constraint} DO NOTHING'
+        )
+        return stream.count, cursor.rowcount
+
+
+def load_in_batches(rows, batch_size):
+    """
+    Загружает строки пачками через bulk_create(ignore_conflicts=True).
+    Возвращает количество прочитанных и добавленных строк.
+    """
+    count = 0
+    with transaction.atomic():
+        initial_count = Ingredient.objects.count()
+        while batch := [
+            Ingredient(name=name, measurement_unit=measurement_unit)
+            for name, measurement_unit in islice(rows, batch_size)
+        ]:
+            Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+            count += len(batch)
+        return count, Ingredient.objects.count() - initial_count
+
+
+class Command(BaseCommand):
+    help = (  # noqa: A003
+        'Загружает ингредиенты из CSV- или JSON-файла. Уже существующие '
+        'ингредиенты пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            type=Path,
+            default=DEFAULT_PATH,
+            help='Путь к файлу (по умолчанию data/ingredients.csv).'
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат файла; по умолчанию определяется по расширению.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Размер пачки bulk_create для СУБД без COPY.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in FORMATS:
+            raise CommandError(
+                f'Неизвестный формат файла: {path}. Укажите --format.'
+            )
+        start = time.perf_counter()
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = READERS[file_format](file)
+            if connection.vendor == 'postgresql':
+                count, created = load_with_copy(rows)
+            else:
+                count, created = load_in_batches(rows, options['batch_size'])
+        elapsed = time.perf_counter() - start
+        if created:
+            bump_reference_data_version()
+        self.stdout.write(
+            f'Прочитано строк: {count}, добавлено: {created}, '
+            f'{count / elapsed:.0f} строк/с'
+        )
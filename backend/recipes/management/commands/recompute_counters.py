@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.feed import sync_timelines
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.utils import count_subquery
+from users.models import Subscription
+
+User = get_user_model()
+
+# Счётчик -> (модель связи, поле группировки).
+RECIPE_COUNTERS = {
+    'favorites_count': (Favorite, 'recipe'),
+    'shopping_carts_count': (ShoppingCart, 'recipe'),
+}
+USER_COUNTERS = {
+    'recipes_count': (Recipe, 'author'),
+    'subscriptions_count': (Subscription, 'user'),
+    'subscribers_count': (Subscription, 'author'),
+    'favorite_recipes_count': (Favorite, 'user'),
+}
+
+
+class Command(BaseCommand):
+    help = (  # noqa: A003
+        'Пересчитывает денормализованные счётчики рецептов и пользователей.'
+    )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        # Каждый набор счётчиков пересчитывается одним UPDATE с
+        # коррелированными подзапросами, без загрузки объектов в память.
+        recipes = Recipe.objects.update(**{
+            counter: count_subquery(model, field)
+            for counter, (model, field) in RECIPE_COUNTERS.items()
+        })
+        users = User.objects.update(**{
+            counter: count_subquery(model, field)
+            for counter, (model, field) in USER_COUNTERS.items()
+        })
+        self.stdout.write(
+            f'Пересчитано рецептов: {recipes}, пользователей: {users}'
+        )
+        # Материализация лент зависит от счётчика подписок.
+        rebuilt, dropped = sync_timelines()
+        self.stdout.write(
+            f'Перестроено лент: {rebuilt}, удалено: {dropped}'
+        )
@@ -0,0 +1,300 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from io import StringIO
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag
+)
+from users.models import Subscription
+
+User = get_user_model()
+
+# Размеры набора данных при --scale 1.
+DEFAULT_SIZES = {
+    'users': 10_000,
+    'authors': 1_000,
+    'recipes': 50_000,
+    'favorites': 500_000,
+    'carts': 50_000,
+    'subscriptions': 100_000,
+}
+TAGS_COUNT = 10
+RECIPE_INGREDIENTS_RANGE = (5, 30)
+RECIPE_TAGS_RANGE = (1, 3)
+BATCH_SIZE = 5000
+
+
+def zipf_cum_weights(count, exponent):
+    """Накопленные веса распределения Ципфа для рангов 1..count."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+@contextmanager
+def explicit_created_at(model):
+    """Позволяет задать created_at вручную, отключая auto_now_add."""
+    field = model._meta.get_field('created_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (  # noqa: A003
+        'Заполняет БД воспроизводимым синтетическим набором данных для '
+        'нагрузочных тестов и замеров: пользователи, рецепты с 5-30 '
+        'ингредиентами, избранное, корзины и подписки с распределением '
+        'популярности по закону Ципфа.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=float,
+            default=1.0,
+            help='Множитель размеров набора данных.'
+        )
+        for name, size in DEFAULT_SIZES.items():
+            parser.add_argument(
+                f'--{name}',
+                type=int,
+                help=f'Количество объектов «{name}» (по умолчанию '
+                     f'{size} × scale).'
+            )
+        parser.add_argument(
+            '--zipf-exponent',
+            type=float,
+            default=1.1,
+            help='Показатель распределения Ципфа для популярности.'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Зерно генератора случайных чисел.'
+        )
+        parser.add_argument(
+            '--prefix',
+            default='seed',
+            help='Префикс логинов создаваемых пользователей.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Размер пачки bulk_create.'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='За сколько дней распределить даты публикации рецептов.'
+        )
+
+    def handle(self, *args, **options):
+        sizes = {
+            name: (
+                options[name] if options[name] is not None
+                else max(1, int(size * options['scale']))
+            )
+            for name, size in DEFAULT_SIZES.items()
+        }
+        if sizes['authors'] > sizes['users']:
+            raise CommandError('Авторов не может быть больше пользователей.')
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix} уже есть. '
+                'Укажите другой --prefix.'
+            )
+        self.generator = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.zipf_exponent = options['zipf_exponent']
+        start = time.perf_counter()
+
+        call_command('load_ingredients', stdout=StringIO())
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        tag_ids = self.get_tag_ids()
+        user_ids = self.create_users(prefix, sizes['users'])
+        author_ids = user_ids[:sizes['authors']]
+        recipe_ids = self.create_recipes(
+            prefix, author_ids, sizes['recipes'], options['days']
+        )
+        self.create_recipe_relations(recipe_ids, ingredient_ids, tag_ids)
+        self.create_user_recipes(
+            Favorite, user_ids, recipe_ids, sizes['favorites']
+        )
+        self.create_user_recipes(
+            ShoppingCart, user_ids, recipe_ids, sizes['carts']
+        )
+        self.create_subscriptions(
+            user_ids, author_ids, sizes['subscriptions']
+        )
+
+        # Пересчёт счётчиков заодно материализует ленты подписок.
+        call_command('recompute_counters', stdout=StringIO())
+        self.stdout.write(
+            f'Готово за {time.perf_counter() - start:.1f} с'
+        )
+
+    def insert(self, model, objects, ignore_conflicts=False):
+        """Вставляет объекты пачками, не собирая их все в памяти."""
+        start = time.perf_counter()
+        count = model.objects.count()
+        while batch := list(islice(objects, self.batch_size)):
+            model.objects.bulk_create(
+                batch, ignore_conflicts=ignore_conflicts
+            )
+        count = model.objects.count() - count
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{model._meta.verbose_name_plural}: {count} строк, '
+            f'{count / elapsed:.0f} строк/с'
+        )
+
+    def get_tag_ids(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=f'Тег {index}', slug=f'tag-{index}')
+                for index in range(TAGS_COUNT)
+            )
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_users(self, prefix, count):
+        # Хеширование пароля дорогое, поэтому у всех пользователей один
+        # и тот же непригодный для входа пароль.
+        password = make_password(None)
+        self.insert(User, (
+            User(
+                username=f'{prefix}_{index}',
+                email=f'{prefix}_{index}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password
+            )
+            for index in range(count)
+        ))
+        return list(
+            User.objects.filter(
+                username__startswith=f'{prefix}_'
+            ).order_by('id').values_list('id', flat=True)
+        )
+
+    def create_recipes(self, prefix, author_ids, count, days):
+        # Популярные авторы публикуют больше рецептов. Даты публикации
+        # возрастают вместе с id, как при обычной работе сервиса.
+        authors = self.generator.choices(
+            author_ids,
+            cum_weights=zipf_cum_weights(
+                len(author_ids), self.zipf_exponent
+            ),
+            k=count
+        )
+        now = timezone.now()
+        offsets = sorted(
+            (self.generator.uniform(0, days * 24 * 60 * 60)
+             for _ in range(count)),
+            reverse=True
+        )
+        with explicit_created_at(Recipe):
+            self.insert(Recipe, (
+                Recipe(
+                    author_id=author_id,
+                    name=f'Рецепт {prefix} {index}',
+                    image='recipe_images/benchmark.png',
+                    text='Описание рецепта',
+                    cooking_time=self.generator.randint(1, 180),
+                    created_at=now - timedelta(seconds=offset)
+                )
+                for index, (author_id, offset) in enumerate(
+                    zip(authors, offsets)
+                )
+            ))
+        return list(
+            Recipe.objects.filter(
+                author_id__in=author_ids
+            ).order_by('id').values_list('id', flat=True)
+        )
+
+    def create_recipe_relations(self, recipe_ids, ingredient_ids, tag_ids):
+        self.insert(RecipeIngredient, (
+            RecipeIngredient(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=self.generator.randint(1, 500)
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in self.generator.sample(
+                ingredient_ids,
+                self.generator.randint(*RECIPE_INGREDIENTS_RANGE)
+            )
+        ))
+        self.insert(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.generator.sample(
+                tag_ids,
+                min(len(tag_ids), self.generator.randint(*RECIPE_TAGS_RANGE))
+            )
+        ))
+
+    def sample_pairs(self, left_ids, right_ids, count):
+        """
+        Пары (left, right) с популярностью по закону Ципфа с обеих сторон:
+        активные пользователи и популярные рецепты (авторы) встречаются
+        чаще. Порядок популярности перемешан, чтобы он не совпадал с id.
+        """
+        left_ids = self.generator.sample(left_ids, len(left_ids))
+        right_ids = self.generator.sample(right_ids, len(right_ids))
+        left_weights = zipf_cum_weights(len(left_ids), 0.8)
+        right_weights = zipf_cum_weights(len(right_ids), self.zipf_exponent)
+        for _ in range(count):
+            yield (
+                self.generator.choices(left_ids, cum_weights=left_weights)[0],
+                self.generator.choices(
+                    right_ids, cum_weights=right_weights
+                )[0]
+            )
+
+    def create_user_recipes(self, model, user_ids, recipe_ids, count):
+        # Повторяющиеся пары отбрасываются уникальным ограничением.
+        self.insert(
+            model,
+            (
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id, recipe_id in self.sample_pairs(
+                    user_ids, recipe_ids, count
+                )
+            ),
+            ignore_conflicts=True
+        )
+
+    def create_subscriptions(self, user_ids, author_ids, count):
+        self.insert(
+            Subscription,
+            (
+                Subscription(user_id=user_id, author_id=author_id)
+                for user_id, author_id in self.sample_pairs(
+                    user_ids, author_ids, count
+                )
+                if user_id != author_id
+            ),
+            ignore_conflicts=True
+        )
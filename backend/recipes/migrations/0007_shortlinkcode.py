@@ -0,0 +1,26 @@
+# Generated by Django 4.2.16 on 2026-10-18 04:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_shoppinglistjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShortLinkCode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=3, unique=True, verbose_name='Код')),
+            ],
+            options={
+                'verbose_name': 'Свободный код короткой ссылки',
+                'verbose_name_plural': 'Свободные коды коротких ссылок',
+                'db_table': 'recipes_short_link_codes',
+                'ordering': ('id',),
+            },
+        ),
+    ]
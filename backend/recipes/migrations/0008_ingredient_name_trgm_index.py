@@ -0,0 +1,34 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:10
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Индекс строится по UPPER(name), так как именно это выражение Django
+# использует в запросах icontains/istartswith для PostgreSQL.
+CREATE_INDEX_SQL = (
+    'CREATE INDEX IF NOT EXISTS ix_recipes_ingredient_name_trgm '
+    'ON recipes_ingredient USING gin (UPPER(name) gin_trgm_ops)'
+)
+DROP_INDEX_SQL = 'DROP INDEX IF EXISTS ix_recipes_ingredient_name_trgm'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX_SQL)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_shortlinkcode'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_index, drop_index),
+    ]
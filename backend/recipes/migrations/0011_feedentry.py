@@ -0,0 +1,62 @@
+# Generated by Django 4.2.16 on 2026-10-18 04:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Значение порога на момент миграции; дальнейшие изменения константы
+# применяются командой recompute_counters.
+FEED_TIMELINE_MIN_SUBSCRIPTIONS = 50
+
+
+def fill_timelines(apps, schema_editor):
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Subscription = apps.get_model('users', 'Subscription')
+    User = apps.get_model('users', 'User')
+    for user_id in User.objects.filter(
+        subscriptions_count__gte=FEED_TIMELINE_MIN_SUBSCRIPTIONS
+    ).values_list('id', flat=True):
+        FeedEntry.objects.bulk_create(
+            (
+                FeedEntry(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in Recipe.objects.filter(
+                    author__in=Subscription.objects.filter(
+                        user=user_id
+                    ).values('author')
+                ).values_list('id', flat=True)
+            ),
+            batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0010_recipe_counters'),
+        ('users', '0007_user_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_users', to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_recipes', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Ленты подписок',
+                'db_table': 'recipes_feed_entries',
+                'ordering': ('user__username', 'recipe__name'),
+                'abstract': False,
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='uq_recipes_feed_entries'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_feedentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoppinglistjob',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Дата и время начала обработки'),
+        ),
+    ]
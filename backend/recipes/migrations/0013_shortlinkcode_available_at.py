@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_shoppinglistjob_started_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shortlinkcode',
+            name='available_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Доступен с'),
+        ),
+    ]
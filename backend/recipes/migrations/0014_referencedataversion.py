@@ -0,0 +1,33 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:17
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def create_version(apps, schema_editor):
+    ReferenceDataVersion = apps.get_model('recipes', 'ReferenceDataVersion')
+    ReferenceDataVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_shortlinkcode_available_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenceDataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Версия')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата и время изменения')),
+            ],
+            options={
+                'verbose_name': 'Версия справочников',
+                'verbose_name_plural': 'Версии справочников',
+                'db_table': 'recipes_reference_data_version',
+            },
+        ),
+        migrations.RunPython(create_version, migrations.RunPython.noop),
+    ]
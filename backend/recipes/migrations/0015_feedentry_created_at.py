@@ -0,0 +1,43 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:12
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_recipe_created_at(apps, schema_editor):
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    FeedEntry.objects.update(
+        created_at=Subquery(
+            Recipe.objects.filter(
+                id=OuterRef('recipe')
+            ).values('created_at')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_referencedataversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedentry',
+            name='created_at',
+            field=models.DateTimeField(null=True, verbose_name='Дата и время публикации рецепта'),
+        ),
+        migrations.RunPython(
+            copy_recipe_created_at, migrations.RunPython.noop
+        ),
+        migrations.AlterField(
+            model_name='feedentry',
+            name='created_at',
+            field=models.DateTimeField(verbose_name='Дата и время публикации рецепта'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-created_at', '-recipe'], name='ix_recipes_feed_user_created'),
+        ),
+    ]
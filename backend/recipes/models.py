@@ -3,6 +3,7 @@ from textwrap import shorten
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.utils import timezone
 
 from foodgram.constants import (
     INGREDIENT_MEASUREMENT_UNIT_MAX_LENGTH,
@@ -12,6 +13,7 @@ from foodgram.constants import (
     RECIPE_INGREDIENT_AMOUNT_MIN_VALUE,
     RECIPE_NAME_MAX_LENGTH,
     RECIPE_SHORT_LINK_CODE_MAX_LENGTH,
+    SHOPPING_LIST_JOB_STATUS_MAX_LENGTH,
     TAG_NAME_MAX_LENGTH,
     TAG_SLUG_MAX_LENGTH
 )
@@ -124,12 +126,34 @@ class Recipe(models.Model):
         verbose_name='Дата и время публикации',
         auto_now_add=True
     )
+    # Счётчики обновляются сигналами (recipes.signals) и пересчитываются
+    # командой recompute_counters.
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        verbose_name='В корзинах',
+        default=0
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         default_related_name = 'recipes'
         ordering = ('-created_at',)
+        indexes = (
+            # Лента рецептов и курсорная пагинация.
+            models.Index(
+                fields=('-created_at', '-id'),
+                name='ix_recipes_recipe_created'
+            ),
+            # Фильтр по автору с сортировкой по дате.
+            models.Index(
+                fields=('author', '-created_at'),
+                name='ix_recipes_recipe_author'
+            ),
+        )
         db_table = 'recipes_recipe'
 
     def __str__(self):
@@ -140,6 +164,34 @@ class Recipe(models.Model):
         )
 
 
+class ShortLinkCode(models.Model):
+    """
+    Свободный код короткой ссылки. Пул заполняется заранее в случайном
+    порядке, а рецепт забирает из него первый доступный код. Код удалённого
+    рецепта возвращается в пул, но выдаётся только после available_at,
+    когда истекут перенаправления, закэшированные процессами.
+    """
+    code = models.CharField(
+        verbose_name='Код',
+        max_length=RECIPE_SHORT_LINK_CODE_MAX_LENGTH,
+        unique=True
+    )
+    available_at = models.DateTimeField(
+        verbose_name='Доступен с',
+        blank=True,
+        null=True
+    )
+
+    class Meta:
+        verbose_name = 'Свободный код короткой ссылки'
+        verbose_name_plural = 'Свободные коды коротких ссылок'
+        ordering = ('id',)
+        db_table = 'recipes_short_link_codes'
+
+    def __str__(self):
+        return self.code
+
+
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(
         Recipe,
@@ -215,6 +267,13 @@ class ShoppingCart(BaseUserRecipe):
                 name='uq_recipes_shopping_carts'
             ),
         )
+        # Обратные выборки по рецепту (пользователи, добавившие рецепт).
+        indexes = (
+            models.Index(
+                fields=('recipe', 'user'),
+                name='ix_recipes_cart_recipe_user'
+            ),
+        )
         db_table = 'recipes_shopping_carts'
 
 
@@ -229,4 +288,121 @@ class Favorite(BaseUserRecipe):
                 name='uq_recipes_favorites'
             ),
         )
+        # Обратные выборки по рецепту (пользователи, добавившие рецепт).
+        indexes = (
+            models.Index(
+                fields=('recipe', 'user'),
+                name='ix_recipes_fav_recipe_user'
+            ),
+        )
         db_table = 'recipes_favorites'
+
+
+class FeedEntry(BaseUserRecipe):
+    """
+    Запись материализованной ленты: рецепт автора, на которого подписан
+    пользователь. Ведётся только для пользователей с большим числом
+    подписок (см. recipes.feed). Время публикации рецепта копируется в
+    запись, чтобы лента читалась по индексу без сортировки рецептов.
+    """
+    created_at = models.DateTimeField(
+        verbose_name='Дата и время публикации рецепта'
+    )
+
+    class Meta(BaseUserRecipe.Meta):
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='uq_recipes_feed_entries'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-created_at', '-recipe'),
+                name='ix_recipes_feed_user_created'
+            ),
+        )
+        db_table = 'recipes_feed_entries'
+
+
+class ShoppingListJob(models.Model):
+    """Задание на фоновое формирование PDF со списком покупок."""
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'В очереди'
+        PROCESSING = 'processing', 'Формируется'
+        DONE = 'done', 'Готово'
+        FAILED = 'failed', 'Ошибка'
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='shopping_list_jobs'
+    )
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=SHOPPING_LIST_JOB_STATUS_MAX_LENGTH,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+    file = models.FileField(  # noqa: A003
+        verbose_name='Файл',
+        upload_to='shopping_lists',
+        blank=True
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Дата и время создания',
+        auto_now_add=True
+    )
+    started_at = models.DateTimeField(
+        verbose_name='Дата и время начала обработки',
+        blank=True,
+        null=True
+    )
+    finished_at = models.DateTimeField(
+        verbose_name='Дата и время завершения',
+        blank=True,
+        null=True
+    )
+
+    class Meta:
+        verbose_name = 'Задание на список покупок'
+        verbose_name_plural = 'Задания на списки покупок'
+        ordering = ('created_at',)
+        indexes = (
+            models.Index(
+                fields=('status', 'created_at'),
+                name='ix_recipes_sl_jobs_queue'
+            ),
+        )
+        db_table = 'recipes_shopping_list_jobs'
+
+    def __str__(self):
+        return f'{self.user} - {self.get_status_display()}'
+
+
+class ReferenceDataVersion(models.Model):
+    """
+    Версия справочников (тегов и ингредиентов). Хранится в БД, чтобы все
+    процессы выдавали одинаковые ETag и меняли их только при изменении
+    данных.
+    """
+    version = models.PositiveIntegerField(
+        verbose_name='Версия',
+        default=0
+    )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата и время изменения',
+        default=timezone.now
+    )
+
+    class Meta:
+        verbose_name = 'Версия справочников'
+        verbose_name_plural = 'Версии справочников'
+        db_table = 'recipes_reference_data_version'
+
+    def __str__(self):
+        return str(self.version)
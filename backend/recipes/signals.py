@@ -0,0 +1,184 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db.models import F, QuerySet
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from foodgram.constants import SHORT_LINK_CACHE_TIMEOUT
+
+from .feed import add_recipe_to_timelines
+from .models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingListJob,
+    ShortLinkCode,
+    Tag
+)
+from .utils import bump_reference_data_version, bump_shopping_cart_versions
+
+User = get_user_model()
+
+
+def get_counter_delta(signal, kwargs):
+    """Изменение счётчика: +1 при создании, -1 при удалении, иначе 0."""
+    if signal is post_delete:
+        return -1
+    return 1 if kwargs.get('created') else 0
+
+
+def shift_counter(field, delta):
+    """
+    Выражение для UPDATE, изменяющее счётчик на delta. Счётчик не уходит
+    ниже нуля, даже если разошёлся с данными до пересчёта
+    recompute_counters.
+    """
+    return Greatest(F(field) + delta, 0)
+
+
+def deleted_with(origin, *models):
+    """
+    Удаляется ли объект каскадом вместе с объектом (или запросом) одной из
+    моделей models. Такие удаления не обновляют счётчики и версии по
+    строкам: это делается группами в pre_delete удаляемого объекта.
+    """
+    if isinstance(origin, QuerySet):
+        return issubclass(origin.model, models)
+    return isinstance(origin, models)
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, origin=None, **kwargs):
+    if not deleted_with(origin, Recipe, User):
+        bump_shopping_cart_versions((instance.user_id,))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, origin=None, **kwargs):
+    # Изменения состава рецепта (в том числе из админки) меняют списки
+    # покупок всех корзин с этим рецептом. При удалении самого рецепта
+    # версии корзин сбрасывает recipe_deleting.
+    if deleted_with(origin, Recipe, User):
+        return
+    bump_shopping_cart_versions(
+        ShoppingCart.objects.filter(
+            recipe=instance.recipe_id
+        ).values('user')
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_changed(sender, instance, created, **kwargs):
+    # Название и единица измерения выводятся в списке покупок.
+    if not created:
+        bump_shopping_cart_versions(
+            ShoppingCart.objects.filter(
+                recipe__recipe_ingredients__ingredient=instance
+            ).values('user')
+        )
+
+
+@receiver(post_delete, sender=ShoppingListJob)
+def shopping_list_job_deleted(sender, instance, **kwargs):
+    if instance.file:
+        instance.file.delete(save=False)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def reference_data_changed(sender, **kwargs):
+    bump_reference_data_version()
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def favorite_changed(sender, instance, signal, origin=None, **kwargs):
+    delta = get_counter_delta(signal, kwargs)
+    if delta and not deleted_with(origin, Recipe, User):
+        Recipe.objects.filter(id=instance.recipe_id).update(
+            favorites_count=shift_counter('favorites_count', delta)
+        )
+        User.objects.filter(id=instance.user_id).update(
+            favorite_recipes_count=shift_counter(
+                'favorite_recipes_count', delta
+            )
+        )
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def shopping_cart_count_changed(sender, instance, signal, origin=None,
+                                **kwargs):
+    delta = get_counter_delta(signal, kwargs)
+    if delta and not deleted_with(origin, Recipe, User):
+        Recipe.objects.filter(id=instance.recipe_id).update(
+            shopping_carts_count=shift_counter(
+                'shopping_carts_count', delta
+            )
+        )
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    # Избранное и корзины рецепта удаляются каскадом: счётчики и версии
+    # корзин пользователей меняются одним запросом, а не по строке.
+    User.objects.filter(
+        id__in=Favorite.objects.filter(recipe=instance).values('user')
+    ).update(
+        favorite_recipes_count=shift_counter('favorite_recipes_count', -1)
+    )
+    # Версии меняются после фиксации, когда корзин уже нет, поэтому
+    # пользователи выбираются сейчас.
+    user_ids = list(
+        ShoppingCart.objects.filter(
+            recipe=instance
+        ).order_by().values_list('user', flat=True)
+    )
+    if user_ids:
+        bump_shopping_cart_versions(user_ids)
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    # Рецепты удаляемого пользователя обрабатывает recipe_deleting, здесь
+    # уменьшаются счётчики чужих рецептов из его избранного и корзины.
+    Recipe.objects.filter(
+        id__in=Favorite.objects.filter(user=instance).values('recipe')
+    ).update(favorites_count=shift_counter('favorites_count', -1))
+    Recipe.objects.filter(
+        id__in=ShoppingCart.objects.filter(user=instance).values('recipe')
+    ).update(
+        shopping_carts_count=shift_counter('shopping_carts_count', -1)
+    )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_changed(sender, instance, signal, origin=None, **kwargs):
+    delta = get_counter_delta(signal, kwargs)
+    if delta and not deleted_with(origin, User):
+        User.objects.filter(id=instance.author_id).update(
+            recipes_count=shift_counter('recipes_count', delta)
+        )
+    if kwargs.get('created'):
+        add_recipe_to_timelines(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_short_link_code_released(sender, instance, **kwargs):
+    # Код возвращается в пул не раньше, чем истекут закэшированные в
+    # процессах перенаправления на удалённый рецепт.
+    if instance.short_link_code:
+        ShortLinkCode.objects.bulk_create(
+            (
+                ShortLinkCode(
+                    code=instance.short_link_code,
+                    available_at=timezone.now() + timedelta(
+                        seconds=SHORT_LINK_CACHE_TIMEOUT
+                    )
+                ),
+            ),
+            ignore_conflicts=True
+        )
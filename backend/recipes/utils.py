@@ -1,12 +1,164 @@
+import logging
 import secrets
+import string
 from textwrap import shorten
 
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
 from foodgram.constants import (
     OBJECT_NAME_MAX_DISPLAY_LENGTH,
-    RECIPE_SHORT_LINK_CODE_MAX_LENGTH
+    RECIPE_SHORT_LINK_CODE_MAX_LENGTH,
+    RECIPE_SHORT_LINK_CODE_MIN_LENGTH,
+    SHORT_LINK_CODE_POOL_FILL_SIZE
 )
 
+logger = logging.getLogger(__name__)
+
+# Алфавит совпадает с кодами, выданными до появления пула.
+SHORT_LINK_CODE_ALPHABET = string.digits + string.ascii_lowercase
+# Единственная строка с версией справочников.
+REFERENCE_DATA_VERSION_ID = 1
+# Попыток подобрать случайный код, когда пул пуст.
+SHORT_LINK_CODE_RANDOM_ATTEMPTS = 10
+
+_random = secrets.SystemRandom()
+
+
+class ShortLinkCodesExhaustedError(Exception):
+    pass
+
+
+def encode_short_link_code(number, length):
+    """Записывает число кодом фиксированной длины в алфавите ссылок."""
+    base = len(SHORT_LINK_CODE_ALPHABET)
+    chars = []
+    for _ in range(length):
+        number, index = divmod(number, base)
+        chars.append(SHORT_LINK_CODE_ALPHABET[index])
+    return ''.join(reversed(chars))
+
+
+def fill_short_link_code_pool(count=SHORT_LINK_CODE_POOL_FILL_SIZE):
+    """
+    Добавляет в пул до count случайных свободных кодов. Берутся коды
+    наименьшей длины, для которой ещё остались свободные значения, поэтому
+    после увеличения RECIPE_SHORT_LINK_CODE_MAX_LENGTH пул сам переходит на
+    более длинные коды. Возвращает количество добавленных кодов.
+    """
+    from .models import Recipe, ShortLinkCode
+    used_codes = set(
+        Recipe.objects.filter(
+            short_link_code__isnull=False
+        ).values_list('short_link_code', flat=True)
+    ) | set(ShortLinkCode.objects.values_list('code', flat=True))
+    new_codes = []
+    for length in range(
+        RECIPE_SHORT_LINK_CODE_MIN_LENGTH,
+        RECIPE_SHORT_LINK_CODE_MAX_LENGTH + 1
+    ):
+        space_size = len(SHORT_LINK_CODE_ALPHABET) ** length
+        # Выборка с запасом на занятые коды гарантирует нужное количество
+        # свободных, если они есть.
+        numbers = _random.sample(
+            range(space_size),
+            min(space_size, count - len(new_codes) + len(used_codes))
+        )
+        for number in numbers:
+            code = encode_short_link_code(number, length)
+            if code not in used_codes:
+                new_codes.append(code)
+                if len(new_codes) == count:
+                    break
+        if len(new_codes) == count:
+            break
+    ShortLinkCode.objects.bulk_create(
+        (ShortLinkCode(code=code) for code in new_codes),
+        ignore_conflicts=True
+    )
+    return len(new_codes)
+
+
+def assign_short_link_code(recipe):
+    """
+    Выдаёт рецепту код из пула за постоянное число запросов. Код
+    блокируется с SKIP LOCKED, а рецепт обновляется только если код ему ещё
+    не назначен, поэтому параллельные запросы не получат один код и не
+    перезапишут друг друга. Пул пополняется командой
+    fill_short_link_code_pool; если он пуст, код выбирается случайно.
+    """
+    from .models import Recipe, ShortLinkCode
+    while True:
+        with transaction.atomic():
+            pool_code = ShortLinkCode.objects.select_for_update(
+                skip_locked=True
+            ).filter(
+                Q(available_at__isnull=True)
+                | Q(available_at__lte=timezone.now())
+            ).order_by('id').first()
+            if pool_code is None:
+                break
+            try:
+                with transaction.atomic():
+                    updated = Recipe.objects.filter(
+                        pk=recipe.pk, short_link_code__isnull=True
+                    ).update(short_link_code=pool_code.code)
+            except IntegrityError:
+                # Код уже занят: его забрал параллельный запрос (в SQLite
+                # нет блокировок строк) или он выдан в обход пула. Код
+                # удаляется из пула, берётся следующий.
+                pool_code.delete()
+                continue
+            if updated:
+                pool_code.delete()
+                recipe.short_link_code = pool_code.code
+                return recipe.short_link_code
+        recipe.refresh_from_db(fields=('short_link_code',))
+        return recipe.short_link_code
+    logger.warning(
+        'Пул кодов коротких ссылок пуст: выполните fill_short_link_code_pool.'
+    )
+    return assign_random_short_link_code(recipe)
+
+
+def assign_random_short_link_code(recipe):
+    """
+    Выдаёт рецепту случайный код наибольшей длины в обход пула. Коды из
+    пула (в том числе освобождённые и ещё недоступные) не выдаются, занятые
+    отбрасываются уникальным ограничением.
+    """
+    from .models import Recipe, ShortLinkCode
+    space_size = len(SHORT_LINK_CODE_ALPHABET) ** (
+        RECIPE_SHORT_LINK_CODE_MAX_LENGTH
+    )
+    for _ in range(SHORT_LINK_CODE_RANDOM_ATTEMPTS):
+        code = encode_short_link_code(
+            _random.randrange(space_size), RECIPE_SHORT_LINK_CODE_MAX_LENGTH
+        )
+        if ShortLinkCode.objects.filter(code=code).exists():
+            continue
+        try:
+            with transaction.atomic():
+                updated = Recipe.objects.filter(
+                    pk=recipe.pk, short_link_code__isnull=True
+                ).update(short_link_code=code)
+        except IntegrityError:
+            continue
+        if updated:
+            recipe.short_link_code = code
+        else:
+            recipe.refresh_from_db(fields=('short_link_code',))
+        return recipe.short_link_code
+    raise ShortLinkCodesExhaustedError(
+        'Не удалось подобрать свободный код короткой ссылки: пополните пул '
+        'или увеличьте RECIPE_SHORT_LINK_CODE_MAX_LENGTH.'
+    )
 
+
+# Прежний генератор кодов; оставлен, так как на него ссылается миграция 0001.
 def generate_unique_short_link_code():
     from .models import Recipe
     while True:
@@ -19,6 +171,77 @@ def generate_unique_short_link_code():
             return random_code
 
 
+def get_shopping_cart_version(user_id):
+    """
+    Возвращает версию корзины пользователя. Версия меняется при любом
+    изменении состава корзины и используется в ключах кэша списка покупок.
+    """
+    return get_user_model().objects.filter(
+        id=user_id
+    ).values_list('shopping_cart_version', flat=True).first()
+
+
+def bump_shopping_cart_versions(user_ids):
+    """
+    Увеличивает версии корзин, делая их кэш недействительным. Версии
+    меняются после фиксации транзакции: новая версия не становится видна
+    раньше изменённых данных, а строки пользователей не блокируются на всё
+    время транзакции. user_ids может быть запросом: он выполняется
+    подзапросом того же UPDATE.
+    """
+    def bump():
+        get_user_model().objects.filter(id__in=user_ids).update(
+            shopping_cart_version=F('shopping_cart_version') + 1
+        )
+    transaction.on_commit(bump)
+
+
+def get_reference_data_version():
+    """
+    Возвращает версию справочников (тегов и ингредиентов) и время её
+    изменения.
+    """
+    from .models import ReferenceDataVersion
+    version = ReferenceDataVersion.objects.filter(
+        pk=REFERENCE_DATA_VERSION_ID
+    ).values_list('version', 'updated_at').first()
+    if version is None:
+        version = ReferenceDataVersion.objects.get_or_create(
+            pk=REFERENCE_DATA_VERSION_ID
+        )[0]
+        return version.version, version.updated_at
+    return version
+
+
+def bump_reference_data_version():
+    from .models import ReferenceDataVersion
+    updated = ReferenceDataVersion.objects.filter(
+        pk=REFERENCE_DATA_VERSION_ID
+    ).update(version=F('version') + 1, updated_at=timezone.now())
+    if not updated:
+        ReferenceDataVersion.objects.get_or_create(
+            pk=REFERENCE_DATA_VERSION_ID, defaults={'version': 1}
+        )
+
+
+def count_subquery(model, field):
+    """
+    Выражение для UPDATE: количество строк model, у которых field указывает
+    на обновляемую строку.
+    """
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                count=Count('pk')
+            ).values('count'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
 def make_relation_name(obj_1, obj_2):
     return (
         shorten(
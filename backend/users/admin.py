@@ -58,6 +58,7 @@ class UserAdmin(UserAdmin):
         'is_staff',
         'is_active',
         'is_superuser',
+        'recipes_count',
         'subscriptions_count',
         'subscribers_count',
         'favorite_recipes_count'
@@ -98,21 +99,10 @@ class UserAdmin(UserAdmin):
             url
         )
 
-    @display(description='Подписок')
-    def subscriptions_count(self, obj):
-        return Subscription.objects.filter(user=obj).count()
-
-    @display(description='Подписчиков')
-    def subscribers_count(self, obj):
-        return Subscription.objects.filter(author=obj).count()
-
-    @display(description='Избранных рецептов')
-    def favorite_recipes_count(self, obj):
-        return Favorite.objects.filter(user=obj).count()
-
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
     search_fields = ('user__username', 'author__username')
     ordering = ('user__username', 'author__username')
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:20
+
+from django.db import migrations, models
+from django.db.models import Q
+
+# Значение порога, по которому миграция recipes.0011 материализовала ленты.
+FEED_TIMELINE_MIN_SUBSCRIPTIONS = 50
+
+
+def fill_has_feed_timeline(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    User.objects.filter(
+        Q(subscriptions_count__gte=FEED_TIMELINE_MIN_SUBSCRIPTIONS)
+        | Q(id__in=FeedEntry.objects.values('user'))
+    ).update(has_feed_timeline=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_feedentry'),
+        ('users', '0008_user_shopping_cart_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='has_feed_timeline',
+            field=models.BooleanField(default=False, verbose_name='Материализованная лента'),
+        ),
+        migrations.RunPython(
+            fill_has_feed_timeline, migrations.RunPython.noop
+        ),
+    ]
@@ -42,6 +42,36 @@ class User(AbstractUser):
         blank=True,
         default=''
     )
+    # Счётчики обновляются сигналами (recipes.signals, users.signals) и
+    # пересчитываются командой recompute_counters.
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов',
+        default=0
+    )
+    subscriptions_count = models.PositiveIntegerField(
+        verbose_name='Подписок',
+        default=0
+    )
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков',
+        default=0
+    )
+    favorite_recipes_count = models.PositiveIntegerField(
+        verbose_name='Избранных рецептов',
+        default=0
+    )
+    # Увеличивается при любом изменении состава корзины и входит в ключи
+    # кэша списка покупок (api.shopping_list), поэтому общая для всех
+    # процессов.
+    shopping_cart_version = models.PositiveIntegerField(
+        verbose_name='Версия корзины',
+        default=0
+    )
+    # Лента подписок материализована в FeedEntry (recipes.feed).
+    has_feed_timeline = models.BooleanField(
+        verbose_name='Материализованная лента',
+        default=False
+    )
 
     class Meta:
         verbose_name = 'Объект "Пользователь"'
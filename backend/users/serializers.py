@@ -16,6 +16,8 @@ class BaseUserSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         return (
             user.is_authenticated
@@ -42,7 +44,6 @@ class UserAvatarSerializer(serializers.ModelSerializer):
 
 class AuthorSerializer(BaseUserSerializer):
     recipes = RecipeShortReadSerializer(many=True, source='limited_recipes')
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -51,9 +52,6 @@ class AuthorSerializer(BaseUserSerializer):
             'is_subscribed', 'recipes', 'recipes_count', 'avatar'
         )
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
 class SubscriptionSerializer(serializers.ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
@@ -0,0 +1,38 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes.feed import drop_short_timelines, update_timeline
+from recipes.signals import deleted_with, get_counter_delta, shift_counter
+
+from .models import Subscription, User
+
+
+@receiver((post_save, post_delete), sender=Subscription)
+def subscription_changed(sender, instance, signal, origin=None, **kwargs):
+    delta = get_counter_delta(signal, kwargs)
+    if delta and not deleted_with(origin, User):
+        User.objects.filter(id=instance.user_id).update(
+            subscriptions_count=shift_counter('subscriptions_count', delta)
+        )
+        User.objects.filter(id=instance.author_id).update(
+            subscribers_count=shift_counter('subscribers_count', delta)
+        )
+        update_timeline(instance, delta)
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    # Подписки удаляемого пользователя удаляются каскадом: счётчики каждой
+    # стороны меняются одним запросом. Записи лент с его рецептами
+    # удаляются вместе с рецептами, а подписчики, опустившиеся ниже порога,
+    # возвращаются к сборке ленты при чтении.
+    User.objects.filter(
+        id__in=Subscription.objects.filter(user=instance).values('author')
+    ).update(subscribers_count=shift_counter('subscribers_count', -1))
+    subscriber_ids = Subscription.objects.filter(
+        author=instance
+    ).values('user')
+    User.objects.filter(id__in=subscriber_ids).update(
+        subscriptions_count=shift_counter('subscriptions_count', -1)
+    )
+    drop_short_timelines(subscriber_ids)
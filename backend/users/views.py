@@ -1,13 +1,14 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Prefetch
+from django.db.models import Exists, F, OuterRef, Prefetch, Value, Window
+from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from rest_framework.settings import api_settings
 
+from api.pagination import AuthorPagination
 from recipes.models import Recipe
 
 from .models import Subscription
@@ -21,6 +22,27 @@ from .serializers import (
 User = get_user_model()
 
 
+def get_limited_recipes_prefetch(recipes_limit=None):
+    """
+    Prefetch последних рецептов авторов с ограничением recipes_limit для
+    каждого автора. Номер рецепта внутри автора вычисляется оконной функцией
+    ROW_NUMBER() OVER (PARTITION BY author_id), поэтому рецепты всей
+    страницы авторов загружаются одним запросом.
+    """
+    recipes_queryset = Recipe.objects.order_by('-created_at', '-id')
+    if recipes_limit:
+        recipes_queryset = recipes_queryset.annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('created_at').desc(), F('id').desc())
+            )
+        ).filter(row_number__lte=recipes_limit)
+    return Prefetch(
+        'recipes', queryset=recipes_queryset, to_attr='limited_recipes'
+    )
+
+
 class UserViewSet(DjoserUserViewSet):
 
     def get_permissions(self):
@@ -28,6 +50,21 @@ class UserViewSet(DjoserUserViewSet):
             return (AllowAny(),)
         return super().get_permissions()
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        # Признак подписки вычисляется подзапросом EXISTS, чтобы
+        # сериализатор не обращался к БД для каждого пользователя страницы.
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.annotate(is_subscribed=Value(False))
+        return queryset.annotate(
+            is_subscribed=Exists(
+                Subscription.objects.filter(user=user, author=OuterRef('pk'))
+            )
+        )
+
     @action(('put',), detail=False, url_path='me/avatar')
     def update_avatar(self, request):
         serializer = UserAvatarSerializer(
@@ -53,20 +90,12 @@ class UserViewSet(DjoserUserViewSet):
         recipes_limit = recipes_limit_serializer.validated_data.get(
             'recipes_limit'
         )
-        # Создание подзапроса для рецептов автора с ограничением по
-        # количеству.
-        recipes_queryset = Recipe.objects.all()
-        if recipes_limit:
-            recipes_queryset = recipes_queryset[:recipes_limit]
-        # Prefetch используется, чтобы применить лимит рецептов для автора с
-        # минимальным количеством запросов к БД (для производительности).
+        # После успешной подписки автор в ответе всегда отмечен подписанным.
         author = get_object_or_404(
-            User.objects.filter(id=id).prefetch_related(
-                Prefetch(
-                    'recipes',
-                    queryset=recipes_queryset,
-                    to_attr='limited_recipes'
-                )
+            User.objects.filter(id=id).annotate(
+                is_subscribed=Value(True)
+            ).prefetch_related(
+                get_limited_recipes_prefetch(recipes_limit)
             )
         )
         subscription_serializer = SubscriptionSerializer(
@@ -100,24 +129,17 @@ class UserViewSet(DjoserUserViewSet):
         recipes_limit = limit_serializer.validated_data.get(
             'recipes_limit'
         )
-        # Создание подзапроса для рецептов автора с ограничением по
-        # количеству.
-        recipes_queryset = Recipe.objects.all()
-        if recipes_limit:
-            recipes_queryset = recipes_queryset[:recipes_limit]
-        # Prefetch используется, чтобы применить лимит рецептов для каждого
-        # автора с минимальным количеством запросов к БД (для
-        # производительности).
+        # Количество рецептов берётся из счётчика User.recipes_count, а
+        # признак подписки известен заранее, поэтому страница из N авторов
+        # загружается фиксированным числом запросов.
         authors = User.objects.filter(
             subscription_users__user=request.user
+        ).annotate(
+            is_subscribed=Value(True)
         ).prefetch_related(
-            Prefetch(
-                'recipes',
-                queryset=recipes_queryset,
-                to_attr='limited_recipes'
-            )
+            get_limited_recipes_prefetch(recipes_limit)
         )
-        paginator = api_settings.DEFAULT_PAGINATION_CLASS()
+        paginator = AuthorPagination()
         authors = paginator.paginate_queryset(authors, request)
         return paginator.get_paginated_response(
             AuthorSerializer(